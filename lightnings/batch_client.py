@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Union
+
+import requests
+
+import meteocat_client
+
+MAXIMUM_BATCH_SIZE: int = 100
+
+
+def _download_batch(route: str, identifiers: List[int], host: str, username: str, token: str, batch_size: int) -> Union[Dict[int, Dict[str, Any]], None]:
+    # Identifiers are sent in chunks of at most batch_size, and never more than the server accepts. The answers of the
+    # chunks not answered are missing, so only those lightnings are asked to the per ID endpoint. None when no chunk is
+    # answered, as the server does not have the batch route
+    batch_size = min(batch_size, MAXIMUM_BATCH_SIZE)
+    answers: Dict[int, Dict[str, Any]] = dict()
+    answered: bool = False
+    for start in range(0, len(identifiers), batch_size):
+        chunk: List[int] = identifiers[start:start + batch_size]
+        url: str = "{}/meteocat/lightning/{}?ids={}".format(host, route, ','.join(str(i) for i in chunk))
+        response: requests.Response = meteocat_client.get(url, username, token)
+        if response.status_code != 200:
+            continue
+        answered = True
+        for identifier, answer in json.loads(response.text).items():
+            answers[int(identifier)] = answer
+    return answers if answered or len(identifiers) == 0 else None
+
+
+def download_land_covers(identifiers: List[int], host: str, username: str, token: str, batch_size: int = MAXIMUM_BATCH_SIZE) -> Union[Dict[int, Dict[str, Any]], None]:
+    return _download_batch('land_cover', identifiers, host, username, token, batch_size)
+
+
+def download_discharge_counts(identifiers: List[int], host: str, username: str, token: str, batch_size: int = MAXIMUM_BATCH_SIZE) -> Union[Dict[int, Dict[str, Any]], None]:
+    return _download_batch('discharge_count', identifiers, host, username, token, batch_size)
+
+
+class BatchLookup(object):
+    """
+    Answers for a list of lightnings that are walked in order and usually abandoned early. The answers are downloaded
+    one batch at a time when a position of a batch not yet downloaded is asked. get() returns None for the lightnings
+    without answer, for the ones of a batch not answered and for all of them if the first batch is not answered, as the
+    server has no batch route, so the caller can ask the per ID endpoint. Lookups can be shared by threads evaluating
+    different positions.
+    """
+    def __init__(self, download: Callable[[List[int]], Union[Dict[int, Dict[str, Any]], None]], identifiers: List[int],
+                 batch_size: int):
+        self.download: Callable[[List[int]], Union[Dict[int, Dict[str, Any]], None]] = download
+        self.identifiers: List[int] = identifiers
+        self.batch_size: int = min(batch_size, MAXIMUM_BATCH_SIZE)
+        self.available: bool = True
+        self._answers: Dict[int, Dict[str, Any]] = dict()
+        self._downloaded: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, position: int) -> Union[Dict[str, Any], None]:
+        with self._lock:
+            while self.available and position >= self._downloaded:
+                chunk: List[int] = self.identifiers[self._downloaded:self._downloaded + self.batch_size]
+                answers: Union[Dict[int, Dict[str, Any]], None] = self.download(chunk)
+                if answers is None and self._downloaded == 0:
+                    self.available = False
+                    break
+                if answers is not None:
+                    self._answers.update(answers)
+                self._downloaded += len(chunk)
+            return self._answers.get(self.identifiers[position])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Compares the per ID and the batch routes against the local stand-in server
+    from meteocat_stub_server import MeteocatStubServer
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', help='Number of lightnings', default=1000, type=int)
+    parser.add_argument('-b', '--batch-size', help='Maximum identifiers per request', default=MAXIMUM_BATCH_SIZE,
+                        type=int)
+    parser.add_argument('-l', '--latency', help='Seconds added to every response', default=0.01, type=float)
+    args = parser.parse_args()
+
+    stub: MeteocatStubServer = MeteocatStubServer(latency=args.latency).start()
+    identifiers: List[int] = list(range(1000000, 1000000 + args.number))
+    start_time: float = time.perf_counter()
+    single: Dict[int, Dict[str, Any]] = dict()
+    for identifier in identifiers:
+        single[identifier] = meteocat_client.get("{}/meteocat/lightning/land_cover/{}".format(stub.host, identifier),
+                                                 'user', 'token').json()
+    single_time: float = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    batch: Union[Dict[int, Dict[str, Any]], None] = download_land_covers(identifiers, stub.host, 'user', 'token',
+                                                                         args.batch_size)
+    batch_time: float = time.perf_counter() - start_time
+    stub.stop()
+    print('Per ID: {} requests in {:.3f} s'.format(args.number, single_time))
+    print('Batch: {} requests in {:.3f} s'.format(stub.requests.get('land_covers', 0), batch_time))
+    print('Same answers:', batch == single)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import run_metrics
+import meteocat_stub_server
+from meteocat_stub_server import MeteocatStubServer
+from meteocat_stub_server import StubData
+
+SCRIPTS_FOLDER: str = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_firefighter_records(filename: str, data: StubData, first_day: datetime.date, days: int, records: int, seed: int) -> None:
+    # Fires started near a lightning hitting the ground, written as the firefighters file
+    generator: random.Random = random.Random(seed)
+    with open(filename, 'w') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Nº Servei', 'DATA', 'HORA', 'X', 'Y', 'NOM_FOC', 'REGIO', 'SUPERFÍCIE (HA)', 'Observacions'])
+        for k in range(records):
+            day: datetime.date = first_day + datetime.timedelta(days=generator.randrange(days))
+            lightnings: List[Dict[str, Any]] = [lightning for lightning in data.day_lightnings(day)
+                                                if lightning['hit_ground']]
+            if len(lightnings) == 0:
+                continue
+            lightning: Dict[str, Any] = generator.choice(lightnings)
+            date: datetime.datetime = datetime.datetime.strptime(lightning['date'], "%Y-%m-%dT%H:%M:%S.%fZ") + \
+                datetime.timedelta(minutes=generator.uniform(30, 180))
+            writer.writerow(['{:02d}/00/{:05d}'.format(day.year % 100, k), date.strftime("%d/%m/%Y"),
+                             date.strftime("%H:%M:%S"),
+                             int(lightning['coordinates_x'] + generator.uniform(-1000, 1000)),
+                             int(lightning['coordinates_y'] + generator.uniform(-1000, 1000)), 'Benchmark', 'BENCH',
+                             '0,0000', ''])
+
+
+def run_script(script: str, arguments: List[str], log_filename: str) -> Tuple[int, float, float]:
+    # Exit code, wall time in seconds and peak resident memory in MB of the script
+    start: float = time.perf_counter()
+    with open(log_filename, 'w') as log:
+        process: subprocess.Popen = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_FOLDER, script)] + arguments,
+                                                     stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux reports the maximum resident set size in kilobytes
+    return process.returncode, time.perf_counter() - start, usage.ru_maxrss / 1024
+
+
+def summarize(script: str, exit_code: int, seconds: float, memory: float, metrics_filename: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {'script': script, 'exit_code': exit_code, 'seconds': seconds, 'peak_memory_mb': memory,
+                              'records': 0, 'records_per_second': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'requests': 0}
+    if not os.path.exists(metrics_filename):
+        return result
+    with open(metrics_filename) as file:
+        metrics: Dict[str, Any] = json.load(file)
+    records: List[float] = metrics['record_seconds']
+    result['records'] = len(records)
+    result['records_per_second'] = len(records) / max(seconds, 1e-9)
+    result['p50_ms'] = 1000 * run_metrics.record_percentile(records, 0.5)
+    result['p99_ms'] = 1000 * run_metrics.record_percentile(records, 0.99)
+    result['requests'] = sum(values['requests'] - values['cache_hits'] for values in metrics['endpoints'].values())
+    return result
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Runs the matching and the three fill scripts against a local stand-in of the API
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--records', help='Firefighter records generated', default=20, type=int)
+    parser.add_argument('-d', '--days', help='Days the firefighter records are spread over', default=30, type=int)
+    parser.add_argument('-f', '--first-day', help='First day of the records as YYYY-MM-DD', default='2016-06-01')
+    parser.add_argument('-w', '--work-folder', help='Folder of the generated and output files, a temporary one by '
+                                                    'default', default=None)
+    parser.add_argument('-a', '--script-arguments', help='Extra arguments given to every script, e.g. "-b 100"',
+                        default='')
+    parser.add_argument('-o', '--report-file', help='JSON file where the results are written', default=None)
+    meteocat_stub_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    folder: str = tempfile.mkdtemp(prefix='benchmark-') if args.work_folder is None else args.work_folder
+    os.makedirs(folder, exist_ok=True)
+    data: StubData = meteocat_stub_server.data_from_arguments(args)
+    fires_filename: str = os.path.join(folder, 'fires.csv')
+    write_firefighter_records(fires_filename, data, datetime.date.fromisoformat(args.first_day), args.days,
+                              args.records, args.seed)
+    stub: MeteocatStubServer = MeteocatStubServer(latency=args.latency, data=data).start()
+    common: List[str] = ['-H', stub.host, '-u', 'benchmark', '-t', 'benchmark'] + shlex.split(args.script_arguments)
+    matched_filename: str = os.path.join(folder, 'matched.csv')
+    runs: List[Tuple[str, str, str]] = [('match_lightnings.py', fires_filename, matched_filename),
+                                        ('fill_positive_lightning_examples.py', matched_filename,
+                                         os.path.join(folder, 'positive.csv')),
+                                        ('fill_negative_lightning_examples.py', matched_filename,
+                                         os.path.join(folder, 'negative.csv')),
+                                        ('fill_other_negative_lightning_examples.py', matched_filename,
+                                         os.path.join(folder, 'other.csv'))]
+    results: List[Dict[str, Any]] = list()
+    try:
+        for script, input_filename, output_filename in runs:
+            name: str = os.path.splitext(script)[0]
+            metrics_filename: str = os.path.join(folder, name + '.json')
+            exit_code, seconds, memory = run_script(
+                script, ['-i', input_filename, '-o', output_filename, '--metrics-file', metrics_filename] + common,
+                os.path.join(folder, name + '.log'))
+            results.append(summarize(script, exit_code, seconds, memory, metrics_filename))
+            if exit_code != 0:
+                print('{} failed, see {}'.format(script, os.path.join(folder, name + '.log')))
+                break
+    finally:
+        stub.stop()
+
+    print('Files in', folder)
+    print('{:45} {:>8} {:>9} {:>10} {:>9} {:>9} {:>9} {:>10}'.format('Script', 'Records', 'Time (s)', 'Records/s',
+                                                                    'p50 (ms)', 'p99 (ms)', 'Requests', 'Peak (MB)'))
+    for result in results:
+        print('{:45} {:8d} {:9.1f} {:10.2f} {:9.1f} {:9.1f} {:9d} {:10.1f}'.format(
+            result['script'], result['records'], result['seconds'], result['records_per_second'], result['p50_ms'],
+            result['p99_ms'], result['requests'], result['peak_memory_mb']))
+    if args.report_file is not None:
+        with open(args.report_file, 'w') as file:
+            json.dump({'arguments': vars(args), 'results': results}, file, indent=2)
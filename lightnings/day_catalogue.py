@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import json
+import os
+from typing import Any
+from typing import Dict
+from typing import Union
+
+import numpy as np
+
+import meteocat_client
+from land_cover_raster import LandCoverRaster
+from lightning_columns import LightningColumns
+from lightning_stream import download_day_columns
+
+UNKNOWN: int = -1
+
+
+class DayCatalogue(object):
+    """
+    Number of lightnings of each day: total, hitting the ground and hitting the ground by land cover, the last one only
+    when the land cover of all of them is in the raster. Days are added as they are downloaded, so the catalogue is
+    built once and only the new days have to be downloaded again. The file is a JSON object: {"<ISO day>": {"total":
+    ..., "ground": ..., "land_covers": {"<code>": ..., ...} or null}, ...}
+    """
+    def __init__(self, filename: Union[str, None] = None, days: Union[Dict[str, Dict[str, Any]], None] = None):
+        self.filename: Union[str, None] = filename
+        self.days: Dict[str, Dict[str, Any]] = dict() if days is None else days
+        self._changed: bool = False
+
+    @classmethod
+    def load(cls, filename: str) -> 'DayCatalogue':
+        if not os.path.exists(filename):
+            return cls(filename)
+        with open(filename) as file:
+            return cls(filename, json.load(file))
+
+    def __contains__(self, day: datetime.date) -> bool:
+        return day.isoformat() in self.days
+
+    def add(self, day: datetime.date, columns: LightningColumns, land_cover_raster: Union[LandCoverRaster, None] = None) -> None:
+        land_covers: Union[Dict[str, int], None] = None
+        if land_cover_raster is not None:
+            codes: np.ndarray = land_cover_raster.sample(columns.x[columns.hit_ground], columns.y[columns.hit_ground])
+            if not np.any(codes == land_cover_raster.nodata):
+                values, counts = np.unique(codes, return_counts=True)
+                land_covers = {str(value): int(count) for value, count in zip(values, counts)}
+        self.days[day.isoformat()] = {'total': len(columns), 'ground': int(np.count_nonzero(columns.hit_ground)),
+                                      'land_covers': land_covers}
+        self._changed = True
+
+    def ground_counts(self, days: np.ndarray) -> np.ndarray:
+        # Lightnings hitting the ground of each day, UNKNOWN for the days not in the catalogue
+        return np.array([self.days.get(str(day), {}).get('ground', UNKNOWN) for day in days], dtype=np.int64)
+
+    def usable_counts(self, days: np.ndarray) -> np.ndarray:
+        # Lightnings hitting the ground on a land cover accepted as negative example, UNKNOWN when not available
+        counts: np.ndarray = np.full(len(days), UNKNOWN, dtype=np.int64)
+        for i, day in enumerate(days):
+            land_covers: Union[Dict[str, int], None] = self.days.get(str(day), {}).get('land_covers')
+            if land_covers is not None:
+                counts[i] = sum(count for code, count in land_covers.items() if 0 < int(code) < 300)
+        return counts
+
+    def short_days(self, days: np.ndarray, minimum: int, usable: bool = False) -> np.ndarray:
+        # Days known to have less than minimum candidates, that can be skipped without downloading them
+        counts: np.ndarray = self.usable_counts(days) if usable else self.ground_counts(days)
+        if usable:
+            # Without land covers the ground count is still a bound
+            counts = np.where(counts == UNKNOWN, self.ground_counts(days), counts)
+        return (counts != UNKNOWN) & (counts < minimum)
+
+    def save(self) -> None:
+        if self.filename is None or not self._changed:
+            return
+        with open(self.filename + '.tmp', 'w') as file:
+            json.dump(self.days, file, sort_keys=True)
+        os.replace(self.filename + '.tmp', self.filename)
+        self._changed = False
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Adds the days of a period that are not yet in the catalogue
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--catalogue-file', help='Day catalogue file, created if it does not exist')
+    parser.add_argument('-f', '--from-day', help='First day as YYYY-MM-DD', default='2014-01-01')
+    parser.add_argument('-e', '--end-day', help='Day after the last one as YYYY-MM-DD', default='2020-01-01')
+    parser.add_argument('-H', '--host', help='Host name were the database cluster is located')
+    parser.add_argument('-u', '--username', help='Database username')
+    parser.add_argument('-t', '--token', help='Database password')
+    parser.add_argument('--land-cover-file', help='Memory mapped land cover raster to count the lightnings by land '
+                                                  'cover', default=None)
+    meteocat_client.add_arguments(parser)
+    args = parser.parse_args()
+    meteocat_client.configure_from_arguments(args)
+    land_cover_raster: Union[LandCoverRaster, None] = None
+    if args.land_cover_file is not None:
+        land_cover_raster = LandCoverRaster.load(args.land_cover_file)
+
+    catalogue: DayCatalogue = DayCatalogue.load(args.catalogue_file)
+    days: np.ndarray = np.arange(np.datetime64(args.from_day), np.datetime64(args.end_day)).astype(datetime.date)
+    added: int = 0
+    for day in days:
+        if day in catalogue:
+            continue
+        columns: Union[LightningColumns, None] = download_day_columns(day, False, args.host, args.username, args.token)
+        if columns is None:
+            print('Lightnings not found!', day)
+            continue
+        catalogue.add(day, columns, land_cover_raster)
+        added += 1
+        if added % 100 == 0:
+            catalogue.save()
+    catalogue.save()
+    print('{} days added, {} days in the catalogue'.format(added, len(catalogue.days)))
+    meteocat_client.close()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import datetime
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import List
+from typing import Tuple
+from typing import Union
+
+
+class DayWindow(object):
+    """
+    Window of the data of the last `size` days ending at a given day. The window is meant to be moved forward over
+    records sorted by date: days that are already loaded are kept, only the days entering the window are loaded and
+    the days falling out of it are released, so no more than `size` days are held in memory.
+    """
+    def __init__(self, size: int, loader: Callable[[datetime.date], Union[Any, None]]):
+        self.size: int = size
+        self.loader: Callable[[datetime.date], Union[Any, None]] = loader
+        self.last_day: Union[datetime.date, None] = None
+        # Loaded days in ascending order
+        self._days: Deque[Tuple[datetime.date, Any]] = collections.deque()
+
+    def move_to(self, last_day: datetime.date) -> bool:
+        if last_day == self.last_day:
+            return False
+        first_day: datetime.date = last_day - datetime.timedelta(days=self.size - 1)
+        if self.last_day is not None and last_day < self.last_day:
+            # Going backwards is not expected with sorted records, start again from an empty window
+            self._days.clear()
+        while len(self._days) > 0 and self._days[0][0] < first_day:
+            self._days.popleft()
+        day: datetime.date = first_day if len(self._days) == 0 else self._days[-1][0] + datetime.timedelta(days=1)
+        while day <= last_day:
+            data: Union[Any, None] = self.loader(day)
+            if data is None:
+                print('Lightnings not found!', day)
+            else:
+                self._days.append((day, data))
+            day += datetime.timedelta(days=1)
+        self.last_day = last_day
+        return True
+
+    def get(self, day: datetime.date) -> Union[Any, None]:
+        # Data of a loaded day, None when the day is not in the window or could not be loaded
+        for loaded_day, data in self._days:
+            if loaded_day == day:
+                return data
+        return None
+
+    def days(self) -> List[Tuple[datetime.date, Any]]:
+        # Most recent day first, the order in which the days were searched before the window existed
+        return list(reversed(self._days))
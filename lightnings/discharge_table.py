@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import json
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+import requests
+
+import lightning_stream
+import meteocat_client
+from batch_client import download_discharge_counts
+from day_window import DayWindow
+from lightning_columns import LightningColumns
+
+# Discharges of the same flash follow each other within this time (microseconds) and distance (meters)
+FLASH_INTERVAL: int = 500000
+FLASH_DISTANCE: float = 10000
+# Counts compared with the discharge count endpoint, once per run
+CHECK_SIZE: int = 10
+
+
+def download_day_lists(day: datetime.date, host: str, username: str, token: str) -> Union[Tuple[LightningColumns, LightningColumns], None]:
+    # Individual and grouped by discharges lightnings of a day, None when the API does not have the individual ones
+    individual: Union[LightningColumns, None] = lightning_stream.download_day_columns(day, False, host, username, token)
+    if individual is None:
+        return None
+    grouped: Union[LightningColumns, None] = lightning_stream.download_day_columns(day, True, host, username, token)
+    if grouped is None:
+        # Without the grouped list no flash can be checked, all the lightnings of the day are asked to the API
+        grouped = LightningColumns.from_lightnings([])
+    return individual, grouped
+
+
+class DischargeTable(object):
+    """
+    Number of discharges of the flash of each lightning of some downloaded days. The grouped_by_discharges list of the
+    API has one lightning of each flash, the individual lightnings are sorted by date and split in flashes where a
+    discharge is further than FLASH_INTERVAL in time or FLASH_DISTANCE in space from the previous one, and only the
+    flashes holding exactly one lightning of the grouped list are kept. The days around the ones searched have to be
+    included, so the flashes crossing midnight are whole. Lightnings not in the table must be asked to the API.
+    """
+    def __init__(self, ids: np.ndarray, counts: np.ndarray):
+        order: np.ndarray = np.argsort(ids, kind='stable')
+        self.ids: np.ndarray = ids[order]
+        self.counts: np.ndarray = counts[order]
+
+    @classmethod
+    def from_columns(cls, columns: LightningColumns, grouped: LightningColumns, interval: int = FLASH_INTERVAL,
+                     distance: float = FLASH_DISTANCE) -> 'DischargeTable':
+        if len(columns) == 0:
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        order: np.ndarray = np.argsort(columns.epoch, kind='stable')
+        ids: np.ndarray = columns.ids[order]
+        gaps: np.ndarray = np.diff(columns.epoch[order])
+        jumps: np.ndarray = np.hypot(np.diff(columns.x[order]), np.diff(columns.y[order]))
+        flashes: np.ndarray = np.cumsum(np.concatenate([[True], (gaps > interval) | (jumps > distance)])) - 1
+        counts: np.ndarray = np.bincount(flashes)[flashes]
+        # Flashes with none or several grouped lightnings are not the ones of the API
+        representatives: np.ndarray = np.bincount(flashes, weights=np.isin(ids, grouped.ids))[flashes]
+        kept: np.ndarray = representatives == 1
+        return cls(ids[kept], counts[kept])
+
+    @classmethod
+    def from_days(cls, days: List[Tuple[datetime.date, Tuple[LightningColumns, LightningColumns]]]) -> 'DischargeTable':
+        # Days as kept by a DayWindow of download_day_lists
+        return cls.from_columns(LightningColumns.concatenate([individual for _, (individual, _) in days]),
+                                LightningColumns.concatenate([grouped for _, (_, grouped) in days]))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def check(self, download: Callable[[List[int]], Union[Dict[int, Dict[str, Any]], None]],
+              size: int = CHECK_SIZE) -> bool:
+        # Compares counts evenly spread over the table with the API, the table is emptied when any of them differs or
+        # is not answered, so all its lightnings are asked to the API
+        if size <= 0 or len(self.ids) == 0:
+            return True
+        positions: np.ndarray = np.unique(np.linspace(0, len(self.ids) - 1, size).astype(np.int64))
+        answers: Union[Dict[int, Dict[str, Any]], None] = download([int(i) for i in self.ids[positions]])
+        for position in positions:
+            answer: Union[Dict[str, Any], None] = None if answers is None else answers.get(int(self.ids[position]))
+            if answer is None or int(answer['count']) != int(self.counts[position]):
+                print('Discharges count differs from the API!', int(self.ids[position]))
+                self.ids = self.ids[:0]
+                self.counts = self.counts[:0]
+                return False
+        return True
+
+    def get(self, identifier: int) -> Union[Dict[str, Any], None]:
+        # Same answer as the discharge count endpoint of the API
+        position: int = int(np.searchsorted(self.ids, identifier))
+        if position < len(self.ids) and self.ids[position] == identifier:
+            return {'count': int(self.counts[position])}
+        return None
+
+
+def download_counts(identifiers: List[int], host: str, username: str, token: str) -> Dict[int, Dict[str, Any]]:
+    # Discharge counts from the batch route, and one by one the ones it does not answer
+    answers: Union[Dict[int, Dict[str, Any]], None] = download_discharge_counts(identifiers, host, username, token)
+    if answers is None:
+        answers = dict()
+    for identifier in [identifier for identifier in identifiers if identifier not in answers]:
+        response: requests.Response = meteocat_client.get("{}/meteocat/lightning/discharge_count/{}?srid=25831".format(
+            host, identifier), username, token)
+        if response.status_code == 200:
+            answers[identifier] = json.loads(response.text)
+    return answers
+
+
+class DischargeDays(object):
+    """
+    Lightnings of the days searched by the negative scripts with the discharge table of each one. The individual and
+    grouped lists of a day are kept with the ones of the day before and after it in a DayWindow. The grouping rule is
+    checked against the API once per run, on the first table with lightnings: when it differs the local counts are not
+    used for the rest of the run and only the individual lists are downloaded.
+    """
+    def __init__(self, host: str, username: str, token: str, check_size: int = CHECK_SIZE):
+        self.host: str = host
+        self.username: str = username
+        self.token: str = token
+        self.check_size: int = check_size
+        self.checked: bool = False
+        self.usable: bool = True
+        self.table: Union[DischargeTable, None] = None
+        self._window: DayWindow = DayWindow(3, lambda day: download_day_lists(day, host, username, token))
+
+    def get(self, day: datetime.date) -> Tuple[Union[LightningColumns, None], Union[DischargeTable, None]]:
+        # Individual lightnings of the day and the table of their discharges, None when they must be asked to the API
+        if not self.usable:
+            return lightning_stream.download_day_columns(day, False, self.host, self.username, self.token), None
+        if self._window.move_to(day + datetime.timedelta(days=1)):
+            self.table = DischargeTable.from_days(self._window.days())
+            if not self.checked and len(self.table) > 0:
+                self.checked = True
+                self.usable = self.table.check(lambda identifiers: download_counts(identifiers, self.host,
+                                                                                   self.username, self.token),
+                                               self.check_size)
+                if not self.usable:
+                    print('Discharges are asked to the API for the rest of the run')
+        day_lists: Union[Tuple[LightningColumns, LightningColumns], None] = self._window.get(day)
+        return (None if day_lists is None else day_lists[0]), (self.table if self.usable else None)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Compares the local counts of a day with the API answers for a sample of its lightnings
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--day', help='Day to check as YYYY-MM-DD')
+    parser.add_argument('-n', '--number', help='Number of lightnings asked to the API', default=100, type=int)
+    parser.add_argument('-H', '--host', help='Host name were the database cluster is located')
+    parser.add_argument('-u', '--username', help='Database username')
+    parser.add_argument('-t', '--token', help='Database password')
+    meteocat_client.add_arguments(parser)
+    args = parser.parse_args()
+    meteocat_client.configure_from_arguments(args)
+
+    day: datetime.date = datetime.date.fromisoformat(args.day)
+    window: DayWindow = DayWindow(3, lambda window_day: download_day_lists(window_day, args.host, args.username,
+                                                                           args.token))
+    window.move_to(day + datetime.timedelta(days=1))
+    table: DischargeTable = DischargeTable.from_days(window.days())
+    lists: Union[Tuple[LightningColumns, LightningColumns], None] = window.get(day)
+    identifiers: List[int] = list() if lists is None else [int(i) for i in lists[0].ids[:args.number]]
+    answers: Dict[int, Dict[str, Any]] = download_counts(identifiers, args.host, args.username, args.token)
+    matches: int = 0
+    missing: int = 0
+    for identifier in identifiers:
+        expected: int = int(answers[identifier]['count']) if identifier in answers else -1
+        found: Union[Dict[str, Any], None] = table.get(identifier)
+        if found is None:
+            missing += 1
+        elif found['count'] == expected:
+            matches += 1
+        else:
+            print('Mismatch', identifier, 'API:', expected, 'local:', found['count'])
+    print('{} lightnings of {} days, {} in the table, {} match'.format(len(identifiers), len(window.days()),
+                                                                        len(identifiers) - missing, matches))
+    meteocat_client.close()
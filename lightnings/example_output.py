@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+from collections import Counter
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Union
+
+
+def read_rows(filename: str) -> Iterator[List[str]]:
+    with open(filename) as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # Skip header
+        for row in reader:
+            yield row
+
+
+class ExampleWriter(object):
+    """
+    Append only CSV output of an example file. The rows produced for an input are appended and flushed together and a
+    checkpoint with the position of the input and the output size is written next to the output, so an interrupted run
+    can be resumed: the output is truncated to the last checkpoint and the inputs up to the checkpointed position are
+    skipped. Positions are the order of the inputs, as the same key can appear in several of them.
+    Without checkpoint, an input is skipped while the output has more rows with its key in the key_column than the
+    inputs with that key already skipped. Outputs whose rows do not hold the input key use key_column None and can only
+    be resumed from a checkpoint.
+    """
+    def __init__(self, filename: str, header: List[str], resume: bool = False, key_column: Union[int, None] = 0):
+        self.filename: str = filename
+        self.checkpoint_filename: str = filename + '.checkpoint'
+        self.rows: int = 0
+        self._resume_position: int = -1
+        self._written_keys: Counter = Counter()
+        if resume and os.path.exists(filename):
+            if os.path.exists(self.checkpoint_filename):
+                with open(self.checkpoint_filename) as file:
+                    checkpoint = json.load(file)
+                # Rows written after the last checkpoint belong to an unfinished input and are discarded
+                os.truncate(filename, checkpoint['offset'])
+                self._resume_position = checkpoint['position']
+                self.rows = checkpoint['rows']
+            elif key_column is not None:
+                # Without checkpoint, the inputs already present in the key column of the output are skipped, as many
+                # times as their key is there
+                rows: List[List[str]] = [row for row in read_rows(filename) if len(row) > key_column]
+                self._written_keys = Counter(row[key_column] for row in rows)
+                self.rows = len(rows)
+            else:
+                raise ValueError('{} cannot be resumed without its checkpoint {}'.format(filename,
+                                                                                       self.checkpoint_filename))
+            self._file = open(filename, 'a')
+            self._writer = csv.writer(self._file)
+            print('Resuming', filename, 'with', self.rows, 'rows')
+        else:
+            self._file = open(filename, 'w')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(header)
+            self._file.flush()
+            if os.path.exists(self.checkpoint_filename):
+                os.remove(self.checkpoint_filename)
+
+    def skip(self, position: int, key: Union[str, None] = None) -> bool:
+        # Inputs are processed in a fixed order, everything up to the checkpointed position is already in the output
+        if position <= self._resume_position:
+            return True
+        if key is not None and self._written_keys[key] > 0:
+            self._written_keys[key] -= 1
+            return True
+        return False
+
+    def commit(self, rows: List[List[Any]], position: int) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows += len(rows)
+        checkpoint = {'position': position, 'offset': self._file.tell(), 'rows': self.rows}
+        with open(self.checkpoint_filename + '.tmp', 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(self.checkpoint_filename + '.tmp', self.checkpoint_filename)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def write_columnar(csv_filename: str, filename: str) -> None:
+    """
+    Converts an example CSV file to a typed columnar file with a fixed schema: int64 ID, UTC timestamp DATE, int16
+    counts and land cover, bool HIT_GROUND and float32 for all the measures. Files ending in .parquet are written as
+    Parquet, any other as uncompressed Arrow IPC (Feather v2) that can be memory mapped. The CSV is read in blocks, so
+    the whole file is never held in memory. Needs pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    with open(csv_filename) as file:
+        header: List[str] = next(csv.reader(file))
+    # Columns not listed are float32 measures
+    types: Dict[str, Any] = {'ID': pa.int64(), 'DATE': pa.timestamp('us', tz='UTC'), 'NUMBER_OF_SENSORS': pa.int16(),
+                             'HIT_GROUND': pa.bool_(), 'DISCHARGES': pa.int16(), 'LAND_COVER': pa.int16()}
+    schema: pa.Schema = pa.schema([(name, types.get(name, pa.float32())) for name in header])
+    reader = pa.csv.open_csv(csv_filename, convert_options=pa.csv.ConvertOptions(column_types=schema))
+    if filename.endswith('.parquet'):
+        writer = pa.parquet.ParquetWriter(filename + '.tmp', schema)
+    else:
+        writer = pa.ipc.new_file(filename + '.tmp', schema)
+    for batch in reader:
+        writer.write_table(pa.Table.from_batches([batch], schema))
+    writer.close()
+    os.replace(filename + '.tmp', filename)
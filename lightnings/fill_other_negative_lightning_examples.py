@@ -5,37 +5,44 @@ import datetime
 import dateutil.parser
 import json
 import argparse
-import csv
 from numpy.random import RandomState
 
-from requests.auth import HTTPBasicAuth
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import Set
 from typing import Union
 
 import pytz
 import requests
 import math
+import numpy as np
+
+import measure_store
+import meteocat_client
+import run_metrics
+from batch_client import BatchLookup
+from batch_client import MAXIMUM_BATCH_SIZE
+from batch_client import download_discharge_counts
+from batch_client import download_land_covers
+from day_catalogue import DayCatalogue
+from discharge_table import DischargeDays
+from discharge_table import DischargeTable
+from land_cover_raster import LandCoverRaster
+from station_catalogue import StationCatalogue
+from weather_aggregation import get_measure_values
+from example_output import ExampleWriter
+from example_output import read_rows
+from example_output import write_columnar
+from lightning_columns import LightningColumns
+from lightning_columns import LightningRecord
+from lightning_columns import to_datetime
+from lightning_stream import download_day_columns
 
 
 def download_lightning(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/{}?srid=25831".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
-    if response.status_code == 200:
-        return json.loads(response.text)
-    else:
-        return None
-
-
-def download_lightnings(requested_day: datetime.datetime, host: str, username: str, token: str) -> Union[List[Dict[str, Any]], None]:
-    year: int = requested_day.year
-    month: int = requested_day.month
-    day: int = requested_day.day
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
-    url: str = "{}/meteocat/lightning/{}/{}/{}?srid=25831".format(host, year, month, day)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -43,9 +50,8 @@ def download_lightnings(requested_day: datetime.datetime, host: str, username: s
 
 
 def download_discharges(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/discharge_count/{}?srid=25831".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -54,9 +60,8 @@ def download_discharges(identifier: int, host: str, username: str, token: str) -
 
 
 def get_land_cover(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/land_cover/{}".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -64,11 +69,10 @@ def get_land_cover(identifier: int, host: str, username: str, token: str) -> Uni
 
 
 def get_nearest_weather_stations(date: datetime.date, x: float, y: float, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/station/nearest?date={}&x={}&y={}&srid=25831".format(host,
                                                                                  date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
                                                                                  str(x), str(y))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -77,13 +81,12 @@ def get_nearest_weather_stations(date: datetime.date, x: float, y: float, host:
 
 
 def get_humidity(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/HR?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/HR?date={}&operation=average,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -92,13 +95,12 @@ def get_humidity(date: datetime.date, average_of_previous_days: int, station_cod
 
 
 def get_temperature(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/T?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/T?date={}&operation=average,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -106,13 +108,12 @@ def get_temperature(date: datetime.date, average_of_previous_days: int, station_
         return None
 
 def get_rain(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/PPT?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/PPT?date={}&operation=sum,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -121,13 +122,12 @@ def get_rain(date: datetime.date, average_of_previous_days: int, station_code: s
 
 
 def get_solar_irradiance(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/RS?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/RS?date={}&operation=sum,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -136,13 +136,12 @@ def get_solar_irradiance(date: datetime.date, average_of_previous_days: int, sta
 
 
 def get_wind(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/VV10?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/VV10?date={}&operation=sum,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -159,17 +158,47 @@ if __name__ == "__main__":  # pragma: no cover
     parser.add_argument('-H', '--host', help='Host name were the database cluster is located')
     parser.add_argument('-u', '--username', help='Database username')
     parser.add_argument('-t', '--token', help='Database password')
+    parser.add_argument('-r', '--resume', help='Continue an interrupted run from its checkpoint appending to the '
+                                                  'output file',
+                        action='store_true')
+    parser.add_argument('-l', '--local-aggregation', help='Aggregate the weather measures locally from one range read '
+                                                          'per variable instead of asking the server for each window',
+                        action='store_true')
+    parser.add_argument('-s', '--stations-file', help='Weather stations catalogue used instead of the API to find '
+                                                      'the nearest station', default=None)
+    parser.add_argument('--land-cover-file', help='Memory mapped land cover raster used instead of the API',
+                        default=None)
+    parser.add_argument('-b', '--batch-size', help='Ask land covers and discharge counts in batches of this many '
+                                                   'lightnings, at most {}, 0 asks one lightning per '
+                                                   'request'.format(MAXIMUM_BATCH_SIZE), default=0, type=int)
+    parser.add_argument('--local-discharges', help='Count the discharges from the individual and grouped lists of the '
+                                                   'day and the days around it instead of asking the API for each '
+                                                   'lightning', action='store_true')
+    parser.add_argument('-d', '--day-catalogue', help='Catalogue of the number of lightnings of each day, used to skip '
+                                                      'the days without enough lightnings and updated with the '
+                                                      'downloaded days', default=None)
+    parser.add_argument('--skip-unusable-days', help='Also skip the days of the catalogue without enough lightnings on '
+                                                     'a valid land cover', action='store_true')
+    parser.add_argument('--columnar-file', help='Also write the examples with a typed schema as Parquet (.parquet) '
+                                                'or memory mappable Arrow (any other extension), needs pyarrow',
+                        default=None)
+    meteocat_client.add_arguments(parser)
+    measure_store.add_arguments(parser)
+    run_metrics.add_arguments(parser)
     # noinspection DuplicatedCode
     args = parser.parse_args()
+    meteocat_client.configure_from_arguments(args)
+    measure_store.configure_from_arguments(args)
+    land_cover_raster: Union[LandCoverRaster, None] = None
+    if args.land_cover_file is not None:
+        land_cover_raster = LandCoverRaster.load(args.land_cover_file)
+    stations: Union[StationCatalogue, None] = None
+    if args.stations_file is not None:
+        stations = StationCatalogue.load(args.stations_file)
+    catalogue: Union[DayCatalogue, None] = None
+    if args.day_catalogue is not None:
+        catalogue = DayCatalogue.load(args.day_catalogue)
 
-    csv_lightnings: List[List[str]] = list()
-    with open(args.input_file) as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader, None)  # Skip header
-        for row in reader:
-            csv_lightnings.append(row)
-
-    csv_output = list()
     header = ['ID', 'DATE', 'PEAK_CURRENT', 'CHI_SQUARED', 'NUMBER_OF_SENSORS', 'HIT_GROUND', 'DISCHARGES', 'LAND_COVER',
               'REL_HUMIDITY', 'AVG_REL_HUMIDITY_1_DAY', 'AVG_REL_HUMIDITY_3_DAY', 'AVG_REL_HUMIDITY_5_DAY',
               'AVG_REL_HUMIDITY_10_DAY', 'AVG_REL_HUMIDITY_15_DAY', 'TEMPERATURE', 'AVG_TEMPERATURE_1_DAY',
@@ -179,120 +208,159 @@ if __name__ == "__main__":  # pragma: no cover
               'SUM_SOLAR_IRRADIANCE_5_DAY', 'SUM_SOLAR_IRRADIANCE_10_DAY', 'SUM_SOLAR_IRRADIANCE_15_DAY', 'WIND',
               'SUM_WIND_1_DAY', 'SUM_WIND_3_DAY', 'SUM_WIND_5_DAY', 'SUM_WIND_10_DAY', 'SUM_WIND_15_DAY',
               ]
-    csv_output.append(header)
-    actual_date = datetime.date(2014, 1, 1)
-    end_date = datetime.date(2020, 1, 1)
-    possible_dates = list()
-    valid_dates = list()
-    invalid_dates = list()
-    while actual_date < end_date:
-        possible_dates.append(actual_date)
-        actual_date += datetime.timedelta(days=1)
-    for lightning in csv_lightnings:
+    writer: ExampleWriter = ExampleWriter(args.output_file, header, args.resume, key_column=None)
+    possible_dates: np.ndarray = np.arange(np.datetime64('2014-01-01'), np.datetime64('2020-01-01'))
+    invalid_dates: Set[datetime.date] = set()
+    positive_count: int = 0
+    for lightning in read_rows(args.input_file):
         date = dateutil.parser.isoparse(lightning[3])
-        invalid_dates.append(datetime.date(date.year, date.month, date.day))
-    valid_dates = [x for x in possible_dates if x not in invalid_dates]
+        invalid_dates.add(datetime.date(date.year, date.month, date.day))
+        positive_count += 1
+    valid_dates: np.ndarray = possible_dates[~np.isin(possible_dates, np.array(sorted(invalid_dates),
+                                                                               dtype='datetime64[D]'))]
+    # Shuffling the array permutes it as the list of dates was
     rs = RandomState(1234567890)
     rs.shuffle(valid_dates)
+    short_dates: np.ndarray = np.zeros(len(valid_dates), dtype=bool)
+    if catalogue is not None:
+        short_dates = catalogue.short_days(valid_dates, 10, args.skip_unusable_days)
     picked_days = 0
-    for date in valid_dates:
+    # Discharges are counted on the whole day and the days around it, before removing the lightnings that are not
+    # candidates
+    discharge_days: Union[DischargeDays, None] = None
+    if args.local_discharges:
+        discharge_days = DischargeDays(args.host, args.username, args.token)
+    run_metrics.start_records()
+    for input_position, (date, short) in enumerate(zip(valid_dates.astype(datetime.date), short_dates)):
+        if writer.skip(input_position):
+            continue
+        if short:
+            print('Lightnings not found!', date)
+            continue
         # Get the same day lightnings
-        negative_lightnings: List[Dict[str, Any]] = download_lightnings(datetime.datetime(date.year, date.month, date.day, 0, 0, 0), args.host, args.username, args.token)
-        if negative_lightnings is None:
+        with run_metrics.stage('download'):
+            day_columns: Union[LightningColumns, None] = None
+            discharge_table: Union[DischargeTable, None] = None
+            if discharge_days is not None:
+                day_columns, discharge_table = discharge_days.get(date)
+            else:
+                day_columns = download_day_columns(date, False, args.host, args.username, args.token)
+        if day_columns is None:
             print('Lightnings not found!', date)
             continue
-        negative_lightnings = [i for i in negative_lightnings if bool(i['hit_ground'])]
-        if len(negative_lightnings) < 10:
+        # The catalogue counts are computed on the whole day, before removing the lightnings that are not candidates
+        if catalogue is not None and date not in catalogue:
+            catalogue.add(date, day_columns, land_cover_raster)
+            catalogue.save()
+        if np.count_nonzero(day_columns.hit_ground) < 10:
             print('Lightnings not found!', date)
             continue
         print('Found lightnings in date:', date)
         # Remove non ground and lightnings that caused ignition
         # Use random to select elements, but keep consistency between executions
         rs = RandomState(1234567890)
-        rs.shuffle(negative_lightnings)
+        negative_columns: LightningColumns = day_columns.take(np.flatnonzero(day_columns.hit_ground))
+        shuffled: np.ndarray = np.arange(len(negative_columns))
+        rs.shuffle(shuffled)
+        # Nearest stations of all the candidates in one lookup, None where the API has to be asked
+        station_codes: np.ndarray = np.full(len(negative_columns), None, dtype=object)
+        if stations is not None:
+            station_codes = stations.nearest(negative_columns.epoch, negative_columns.x, negative_columns.y)
+        land_covers: List[Union[Dict[str, Any], None]] = [None] * len(negative_columns)
+        if land_cover_raster is not None:
+            land_covers = land_cover_raster.land_covers(negative_columns.x, negative_columns.y)
+        land_lookup: Union[BatchLookup, None] = None
+        discharge_lookup: Union[BatchLookup, None] = None
+        if args.batch_size > 0:
+            shuffled_identifiers: List[int] = [int(i) for i in negative_columns.ids[shuffled]]
+            land_lookup = BatchLookup(lambda chunk: download_land_covers(chunk, args.host, args.username, args.token,
+                                                                         args.batch_size),
+                                      shuffled_identifiers, args.batch_size)
+            discharge_lookup = BatchLookup(lambda chunk: download_discharge_counts(chunk, args.host, args.username,
+                                                                                   args.token, args.batch_size),
+                                           shuffled_identifiers, args.batch_size)
         negative_dataset = list()
-        for negative_lightning in negative_lightnings:
-            land_cover = None
-            land = get_land_cover(int(negative_lightning['id']), args.host, args.username, args.token)
-            if land is None:
-                print('Land cover not found!', negative_lightning['id'])
-                break
-            else:
-                if 0 < int(land['land_cover_type']) < 300:
-                    land_cover = int(land['land_cover_type'])
+        with run_metrics.stage('enrichment'):
+            for order, position in enumerate(shuffled):
+                candidate: LightningRecord = negative_columns.record(position)
+                identifier = candidate.id
+                lightning_date: datetime.datetime = to_datetime(candidate.epoch)
+                land_cover = None
+                land = land_covers[position]
+                if land is None and land_lookup is not None:
+                    land = land_lookup.get(order)
+                if land is None:
+                    land = get_land_cover(identifier, args.host, args.username, args.token)
+                if land is None:
+                    print('Land cover not found!', identifier)
+                    break
                 else:
+                    if 0 < int(land['land_cover_type']) < 300:
+                        land_cover = int(land['land_cover_type'])
+                    else:
+                        continue
+                count = None if discharge_table is None else discharge_table.get(identifier)
+                if count is None and discharge_lookup is not None:
+                    count = discharge_lookup.get(order)
+                if count is None:
+                    count = download_discharges(identifier, args.host, args.username, args.token)
+                if count is None:
+                    print('Error in discharges count!', identifier)
+                    break
+                discharges = int(count['count'])
+                peak_current = candidate.peak_current
+                chi_squared = candidate.chi_squared
+                number_of_sensors = candidate.number_of_sensors
+                hit_ground = candidate.hit_ground
+                weather_station_code = station_codes[position]
+                if weather_station_code is None:
+                    weather_station = get_nearest_weather_stations(lightning_date,
+                                                                   candidate.x, candidate.y,
+                                                                   args.host, args.username, args.token)
+                    weather_station_code = weather_station['code']
+                print(weather_station_code)
+                days = [0, 1, 3, 5, 10, 15]
+                measures = list()
+                # Get Humidity
+                measures += get_measure_values(get_humidity, 'HR', lightning_date, days, weather_station_code,
+                                               args.local_aggregation, args.host, args.username, args.token)
+                if measures[-1] is None:
                     continue
-            count = download_discharges(int(negative_lightning['id']), args.host, args.username, args.token)
-            if count is None:
-                print('Error in discharges count!', int(negative_lightning['id']))
-                break
-            discharges = int(count['count'])
-            peak_current = float(negative_lightning['peak_current'])
-            chi_squared = float(negative_lightning['chi_squared'])
-            number_of_sensors = int(negative_lightning['number_of_sensors'])
-            hit_ground = bool(negative_lightning['hit_ground'])
-            weather_station = get_nearest_weather_stations(dateutil.parser.isoparse(negative_lightning['date']),
-                                                           float(negative_lightning['coordinates_x']), float(negative_lightning['coordinates_y']),
-                                                           args.host, args.username, args.token)
-            weather_station_code = weather_station['code']
-            print(weather_station_code)
-            days = [0, 1, 3, 5, 10, 15]
-            measures = list()
-            # Get Humidity
-            for day in days:
-                measure = get_humidity(dateutil.parser.isoparse(negative_lightning['date']), day, weather_station_code, args.host, args.username, args.token)
-                if measure is not None:
-                    measures.append(float(measure['value']))
-                else:
-                    measures.append(None)
-            if measures[-1] is None:
-                continue
-            # Get Temperature
-            for day in days:
-                measure = get_temperature(dateutil.parser.isoparse(negative_lightning['date']), day, weather_station_code, args.host, args.username, args.token)
-                if measure is not None:
-                    measures.append(float(measure['value']))
-                else:
-                    measures.append(None)
-            if measures[-1] is None:
-                continue
-            # Get Rain
-            for day in days:
-                measure = get_rain(dateutil.parser.isoparse(negative_lightning['date']), day, weather_station_code, args.host, args.username, args.token)
-                if measure is not None:
-                    measures.append(float(measure['value']))
-                else:
-                    measures.append(None)
-            if measures[-1] is None:
-                continue
-            # Get Solar irradiance
-            for day in days:
-                measure = get_solar_irradiance(dateutil.parser.isoparse(negative_lightning['date']), day, weather_station_code, args.host, args.username, args.token)
-                if measure is not None:
-                    measures.append(float(measure['value']))
-                else:
-                    measures.append(None)
-            # Get Wind
-            for day in days:
-                measure = get_wind(dateutil.parser.isoparse(negative_lightning['date']), day, weather_station_code, args.host, args.username, args.token)
-                if measure is not None:
-                    measures.append(float(measure['value']))
-                else:
-                    measures.append(None)
-
-            new_row = [int(negative_lightning['id']), negative_lightning['date'], peak_current, chi_squared, number_of_sensors, hit_ground, discharges, land_cover]
-            for measure in measures:
-                new_row.append(measure)
-            negative_dataset.append(new_row)
-            if len(negative_dataset) == 10:
-                break
+                # Get Temperature
+                measures += get_measure_values(get_temperature, 'T', lightning_date, days, weather_station_code,
+                                               args.local_aggregation, args.host, args.username, args.token)
+                if measures[-1] is None:
+                    continue
+                # Get Rain
+                measures += get_measure_values(get_rain, 'PPT', lightning_date, days, weather_station_code,
+                                               args.local_aggregation, args.host, args.username, args.token)
+                if measures[-1] is None:
+                    continue
+                # Get Solar irradiance
+                measures += get_measure_values(get_solar_irradiance, 'RS', lightning_date, days, weather_station_code,
+                                               args.local_aggregation, args.host, args.username, args.token)
+                # Get Wind
+                measures += get_measure_values(get_wind, 'VV10', lightning_date, days, weather_station_code,
+                                               args.local_aggregation, args.host, args.username, args.token)
 
-        csv_output += negative_dataset
+                new_row = [identifier, candidate.date, peak_current, chi_squared, number_of_sensors, hit_ground, discharges, land_cover]
+                for measure in measures:
+                    new_row.append(measure)
+                negative_dataset.append(new_row)
+                if len(negative_dataset) == 10:
+                    break
 
-        with open(args.output_file, 'w') as file:
-            writer = csv.writer(file)
-            writer.writerows(csv_output)
+        with run_metrics.stage('write'):
+            writer.commit(negative_dataset, input_position)
+        run_metrics.record()
 
-        if len(csv_output) >= len(csv_lightnings) * 10:
+        # The header row is counted as in the original in-memory output
+        if writer.rows + 1 >= positive_count * 10:
             break
 
+    writer.close()
+    if args.columnar_file is not None:
+        write_columnar(args.output_file, args.columnar_file)
+    measure_store.close()
+    meteocat_client.close()
+    run_metrics.report(args.metrics_file)
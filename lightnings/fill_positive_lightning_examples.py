@@ -5,9 +5,11 @@ import datetime
 import dateutil.parser
 import json
 import argparse
-import csv
-from requests.auth import HTTPBasicAuth
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
+from typing import Callable
 from typing import Dict
 from typing import List
 from typing import Union
@@ -16,21 +18,31 @@ import pytz
 import requests
 import math
 
+import measure_store
+import meteocat_client
+import run_metrics
+from land_cover_raster import LandCoverRaster
+from station_catalogue import StationCatalogue
+from measure_store import get_measure
+from weather_aggregation import get_aggregates
+from example_output import ExampleWriter
+from example_output import read_rows
+from example_output import write_columnar
+from lightning_columns import LightningRecord
 
-def download_lightning(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
+
+def download_lightning(identifier: int, host: str, username: str, token: str) -> Union[LightningRecord, None]:
     url: str = "{}/meteocat/lightning/{}?srid=25831".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
-        return json.loads(response.text)
+        return LightningRecord.from_lightning(json.loads(response.text))
     else:
         return None
 
 
 def download_discharges(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/discharge_count/{}?srid=25831".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -39,9 +51,8 @@ def download_discharges(identifier: int, host: str, username: str, token: str) -
 
 
 def get_land_cover(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/land_cover/{}".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -49,11 +60,10 @@ def get_land_cover(identifier: int, host: str, username: str, token: str) -> Uni
 
 
 def get_nearest_weather_stations(date: datetime.date, x: float, y: float, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/station/nearest?date={}&x={}&y={}&srid=25831".format(host,
                                                                                  date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
                                                                                  str(x), str(y))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -62,13 +72,12 @@ def get_nearest_weather_stations(date: datetime.date, x: float, y: float, host:
 
 
 def get_humidity(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/HR?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/HR?date={}&operation=average,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -77,13 +86,12 @@ def get_humidity(date: datetime.date, average_of_previous_days: int, station_cod
 
 
 def get_temperature(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/T?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/T?date={}&operation=average,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -91,13 +99,12 @@ def get_temperature(date: datetime.date, average_of_previous_days: int, station_
         return None
 
 def get_rain(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/PPT?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/PPT?date={}&operation=sum,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -106,13 +113,12 @@ def get_rain(date: datetime.date, average_of_previous_days: int, station_code: s
 
 
 def get_solar_irradiance(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/RS?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/RS?date={}&operation=sum,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -121,13 +127,12 @@ def get_solar_irradiance(date: datetime.date, average_of_previous_days: int, sta
 
 
 def get_wind(date: datetime.date, average_of_previous_days: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/data/measure/{}/VV10?date={}".format(host, station_code,
                                                                date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
     if average_of_previous_days != 0:
         url: str = "{}/meteocat/data/measure/{}/VV10?date={}&operation=sum,{}".\
             format(host, station_code, date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), str(average_of_previous_days))
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -135,6 +140,33 @@ def get_wind(date: datetime.date, average_of_previous_days: int, station_code: s
         return None
 
 
+MEASURES: List[Callable[[datetime.date, int, str, str, str, str], Union[Dict[str, Any], None]]] = [
+    get_humidity, get_temperature, get_rain, get_solar_irradiance, get_wind]
+VARIABLES: List[str] = ['HR', 'T', 'PPT', 'RS', 'VV10']
+DAYS: List[int] = [0, 1, 3, 5, 10, 15]
+REQUIRED_MEASURES: int = 3
+
+
+def get_measures(executor: Executor, date: datetime.datetime, station_code: str, local: bool, host: str, username: str, token: str) -> List[List[Union[float, None]]]:
+    # All the measures are requested at once, the values are returned grouped by variable in the MEASURES order
+    values: List[Union[List[Union[float, None]], None]] = [None] * len(MEASURES)
+    if local:
+        # One range read per variable aggregated locally
+        series_futures: List[Future] = [executor.submit(get_aggregates, date, DAYS, variable, station_code, host,
+                                                        username, token) for variable in VARIABLES]
+        values = [future.result() for future in series_futures]
+    # Server side aggregations for the variables without a local series
+    futures: List[Union[List[Future], None]] = [
+        None if values[i] is not None else
+        [executor.submit(get_measure, measure, VARIABLES[i], date, day, station_code, host, username, token)
+         for day in DAYS]
+        for i, measure in enumerate(MEASURES)]
+    for i, variable in enumerate(futures):
+        if variable is not None:
+            values[i] = [None if future.result() is None else float(future.result()['value']) for future in variable]
+    return values
+
+
 if __name__ == "__main__":  # pragma: no cover
     # Config the program arguments
     # noinspection DuplicatedCode
@@ -144,17 +176,35 @@ if __name__ == "__main__":  # pragma: no cover
     parser.add_argument('-H', '--host', help='Host name were the database cluster is located')
     parser.add_argument('-u', '--username', help='Database username')
     parser.add_argument('-t', '--token', help='Database password')
+    parser.add_argument('-c', '--concurrency', help='Maximum number of simultaneous requests per lightning',
+                        default=meteocat_client.DEFAULT_POOL_SIZE, type=int)
+    parser.add_argument('-r', '--resume', help='Continue an interrupted run appending to the output file',
+                        action='store_true')
+    parser.add_argument('-l', '--local-aggregation', help='Aggregate the weather measures locally from one range read '
+                                                          'per variable instead of asking the server for each window',
+                        action='store_true')
+    parser.add_argument('-s', '--stations-file', help='Weather stations catalogue used instead of the API to find '
+                                                      'the nearest station', default=None)
+    parser.add_argument('--land-cover-file', help='Memory mapped land cover raster used instead of the API',
+                        default=None)
+    parser.add_argument('--columnar-file', help='Also write the examples with a typed schema as Parquet (.parquet) '
+                                                'or memory mappable Arrow (any other extension), needs pyarrow',
+                        default=None)
+    meteocat_client.add_arguments(parser)
+    measure_store.add_arguments(parser)
+    run_metrics.add_arguments(parser)
     # noinspection DuplicatedCode
     args = parser.parse_args()
+    args.pool_size = max(args.pool_size, args.concurrency)
+    meteocat_client.configure_from_arguments(args)
+    measure_store.configure_from_arguments(args)
+    land_cover_raster: Union[LandCoverRaster, None] = None
+    if args.land_cover_file is not None:
+        land_cover_raster = LandCoverRaster.load(args.land_cover_file)
+    stations: Union[StationCatalogue, None] = None
+    if args.stations_file is not None:
+        stations = StationCatalogue.load(args.stations_file)
 
-    csv_lightnings: List[List[str]] = list()
-    with open(args.input_file) as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader, None)  # Skip header
-        for row in reader:
-            csv_lightnings.append(row)
-
-    csv_output = list()
     header = ['ID', 'DATE', 'PEAK_CURRENT', 'CHI_SQUARED', 'NUMBER_OF_SENSORS', 'HIT_GROUND', 'DISCHARGES', 'LAND_COVER',
               'REL_HUMIDITY', 'AVG_REL_HUMIDITY_1_DAY', 'AVG_REL_HUMIDITY_3_DAY', 'AVG_REL_HUMIDITY_5_DAY',
               'AVG_REL_HUMIDITY_10_DAY', 'AVG_REL_HUMIDITY_15_DAY', 'TEMPERATURE', 'AVG_TEMPERATURE_1_DAY',
@@ -164,83 +214,75 @@ if __name__ == "__main__":  # pragma: no cover
               'SUM_SOLAR_IRRADIANCE_5_DAY', 'SUM_SOLAR_IRRADIANCE_10_DAY', 'SUM_SOLAR_IRRADIANCE_15_DAY', 'WIND',
               'SUM_WIND_1_DAY', 'SUM_WIND_3_DAY', 'SUM_WIND_5_DAY', 'SUM_WIND_10_DAY', 'SUM_WIND_15_DAY',
               ]
-    csv_output.append(header)
-    for lightning in csv_lightnings:
+    writer: ExampleWriter = ExampleWriter(args.output_file, header, args.resume)
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=args.concurrency)
+    run_metrics.start_records()
+    for input_position, lightning in enumerate(read_rows(args.input_file)):
+        if writer.skip(input_position, lightning[0]):
+            continue
         identifier = int(lightning[0])
-        data = download_lightning(identifier, args.host, args.username, args.token)
+        # The lightning, its discharges and its land cover only depend on the identifier
+        data_future: Future = executor.submit(download_lightning, identifier, args.host, args.username, args.token)
+        count_future: Future = executor.submit(download_discharges, identifier, args.host, args.username, args.token)
+        land_future: Union[Future, None] = None
+        if land_cover_raster is None:
+            land_future = executor.submit(get_land_cover, identifier, args.host, args.username, args.token)
+        with run_metrics.stage('download'):
+            data = data_future.result()
         if data is None:
             print('Lightning not found!', identifier)
             break
-        print(data['date'])
-        peak_current = float(data['peak_current'])
-        chi_squared = float(data['chi_squared'])
-        number_of_sensors = int(data['number_of_sensors'])
-        hit_ground = bool(data['hit_ground'])
-        count = download_discharges(identifier, args.host, args.username, args.token)
+        print(data.date)
+        date: datetime.datetime = dateutil.parser.isoparse(data.date)
+        peak_current = data.peak_current
+        chi_squared = data.chi_squared
+        number_of_sensors = data.number_of_sensors
+        hit_ground = data.hit_ground
+        count = count_future.result()
         if count is None:
             print('Error in discharges count!', identifier)
             break
         discharges = int(count['count'])
-        land = get_land_cover(identifier, args.host, args.username, args.token)
+        if land_future is not None:
+            land = land_future.result()
+        else:
+            land = land_cover_raster.land_cover(data.x, data.y)
+            if land is None:
+                land = get_land_cover(identifier, args.host, args.username, args.token)
         if land is None:
             print('Land cover not found!', identifier)
             break
         land_cover = int(land['land_cover_type'])
-        weather_station = get_nearest_weather_stations(dateutil.parser.isoparse(data['date']),
-                                                       float(data['coordinates_x']), float(data['coordinates_y']),
-                                                       args.host, args.username, args.token)
-        weather_station_code = weather_station['code']
-        print(weather_station_code)
-        days = [0, 1, 3, 5, 10, 15]
-        measures = list()
-        # Get Humidity
-        for day in days:
-            measure = get_humidity(dateutil.parser.isoparse(data['date']), day, weather_station_code, args.host, args.username, args.token)
-            if measure is not None:
-                measures.append(float(measure['value']))
-            else:
-                measures.append(None)
-        if measures[-1] is None:
-            continue
-        # Get Temperature
-        for day in days:
-            measure = get_temperature(dateutil.parser.isoparse(data['date']), day, weather_station_code, args.host, args.username, args.token)
-            if measure is not None:
-                measures.append(float(measure['value']))
-            else:
-                measures.append(None)
-        if measures[-1] is None:
+        with run_metrics.stage('enrichment'):
+            weather_station_code = None
+            if stations is not None:
+                weather_station_code = stations.nearest_code(date, data.x, data.y)
+            if weather_station_code is None:
+                weather_station = get_nearest_weather_stations(date, data.x, data.y, args.host, args.username,
+                                                               args.token)
+                weather_station_code = weather_station['code']
+            print(weather_station_code)
+            # Get Humidity, Temperature, Rain, Solar irradiance and Wind
+            variables = get_measures(executor, date, weather_station_code, args.local_aggregation, args.host,
+                                     args.username, args.token)
+        # Lightnings without humidity, temperature or rain are discarded
+        if any(variable[-1] is None for variable in variables[:REQUIRED_MEASURES]):
+            writer.commit([], input_position)
+            run_metrics.record()
             continue
-        # Get Rain
-        for day in days:
-            measure = get_rain(dateutil.parser.isoparse(data['date']), day, weather_station_code, args.host, args.username, args.token)
-            if measure is not None:
-                measures.append(float(measure['value']))
-            else:
-                measures.append(None)
-        if measures[-1] is None:
-            continue
-        # Get Solar irradiance
-        for day in days:
-            measure = get_solar_irradiance(dateutil.parser.isoparse(data['date']), day, weather_station_code, args.host, args.username, args.token)
-            if measure is not None:
-                measures.append(float(measure['value']))
-            else:
-                measures.append(None)
-        # Get Wind
-        for day in days:
-            measure = get_wind(dateutil.parser.isoparse(data['date']), day, weather_station_code, args.host, args.username, args.token)
-            if measure is not None:
-                measures.append(float(measure['value']))
-            else:
-                measures.append(None)
-
-        new_row = [identifier, data['date'], peak_current, chi_squared, number_of_sensors, hit_ground, discharges, land_cover]
+        measures = [measure for variable in variables for measure in variable]
+
+        new_row = [identifier, data.date, peak_current, chi_squared, number_of_sensors, hit_ground, discharges, land_cover]
         for measure in measures:
             new_row.append(measure)
-        csv_output.append(new_row)
-
-        with open(args.output_file, 'w') as file:
-            writer = csv.writer(file)
-            writer.writerows(csv_output)
+        with run_metrics.stage('write'):
+            writer.commit([new_row], input_position)
+        run_metrics.record()
 
+    executor.shutdown()
+    writer.close()
+    if args.columnar_file is not None:
+        write_columnar(args.output_file, args.columnar_file)
+    measure_store.close()
+    meteocat_client.close()
+    run_metrics.report(args.metrics_file)
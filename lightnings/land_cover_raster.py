@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Union
+
+import numpy as np
+
+
+class LandCoverRaster(object):
+    """
+    Land cover raster in EPSG:25831 stored as a NumPy .npy file that is memory mapped, so only the pages of the sampled
+    pixels are read. The geotransform is kept next to it in <filename>.json with the GDAL convention: {"geotransform":
+    [origin_x, pixel_width, 0, origin_y, 0, pixel_height], "nodata": value}. Points outside the raster or on no data
+    pixels have no land cover and must be asked to the API.
+    """
+    def __init__(self, data: np.ndarray, geotransform: List[float], nodata: int):
+        if geotransform[2] != 0 or geotransform[4] != 0:
+            raise ValueError('Rotated rasters are not supported')
+        self.data: np.ndarray = data
+        self.geotransform: List[float] = geotransform
+        self.nodata: int = nodata
+
+    @classmethod
+    def load(cls, filename: str) -> 'LandCoverRaster':
+        with open(filename + '.json') as file:
+            metadata: Dict[str, Any] = json.load(file)
+        return cls(np.load(filename, mmap_mode='r'), [float(value) for value in metadata['geotransform']],
+                   int(metadata.get('nodata', 0)))
+
+    def sample(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # Pixel containing each point, as the database does when it reads the raster value of a point
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        columns: np.ndarray = np.floor((x - self.geotransform[0]) / self.geotransform[1]).astype(np.int64)
+        rows: np.ndarray = np.floor((y - self.geotransform[3]) / self.geotransform[5]).astype(np.int64)
+        inside: np.ndarray = (columns >= 0) & (columns < self.data.shape[1]) & (rows >= 0) & (rows < self.data.shape[0])
+        codes: np.ndarray = np.full(len(x), self.nodata, dtype=np.int64)
+        codes[inside] = self.data[rows[inside], columns[inside]]
+        return codes
+
+    def land_covers(self, x: np.ndarray, y: np.ndarray) -> List[Union[Dict[str, Any], None]]:
+        # Same answer as the land cover endpoint of the API, None where the raster has no data
+        return [None if code == self.nodata else {'land_cover_type': int(code)} for code in self.sample(x, y)]
+
+    def land_cover(self, x: float, y: float) -> Union[Dict[str, Any], None]:
+        return self.land_covers(np.array([x]), np.array([y]))[0]
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Converts a GeoTIFF land cover to the memory mappable format, needs the GDAL python bindings
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input-file', help='Land cover GeoTIFF in EPSG:25831')
+    parser.add_argument('-o', '--output-file', help='Land cover .npy file')
+    args = parser.parse_args()
+
+    from osgeo import gdal
+    if not args.output_file.endswith('.npy'):
+        args.output_file += '.npy'
+    dataset = gdal.Open(args.input_file)
+    band = dataset.GetRasterBand(1)
+    np.save(args.output_file, band.ReadAsArray())
+    with open(args.output_file + '.json', 'w') as file:
+        json.dump({'geotransform': list(dataset.GetGeoTransform()), 'epsg': 25831,
+                   'nodata': 0 if band.GetNoDataValue() is None else int(band.GetNoDataValue())}, file)
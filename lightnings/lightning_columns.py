@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import dateutil.parser
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+import numpy as np
+import pytz
+
+EPOCH: datetime.datetime = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+MICROSECONDS: int = 1000000
+# Fields of a lightning of the API stored one per row, dates are the original ISO strings
+LIGHTNING_DTYPE: np.dtype = np.dtype([('id', np.int64), ('meteocat_id', np.int64), ('epoch', np.int64),
+                                      ('x', np.float64), ('y', np.float64), ('peak_current', np.float64),
+                                      ('chi_squared', np.float64), ('number_of_sensors', np.int64),
+                                      ('hit_ground', np.bool_), ('date', 'S32')])
+
+
+def to_epoch(date: datetime.datetime) -> int:
+    # Microseconds since epoch, computed with integers so it is exact as datetime.timedelta is
+    delta: datetime.timedelta = date - EPOCH
+    return (delta.days * 86400 + delta.seconds) * MICROSECONDS + delta.microseconds
+
+
+def to_datetime(epoch: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=int(epoch))
+
+
+def parse_epochs(dates: List[str]) -> np.ndarray:
+    # The API returns UTC dates ending in Z, which NumPy parses in one call once the designator is removed
+    if all(date.endswith('Z') for date in dates):
+        return np.array([date[:-1] for date in dates], dtype='datetime64[us]').astype(np.int64)
+    return np.array([to_epoch(dateutil.parser.isoparse(date)) for date in dates], dtype=np.int64)
+
+
+def parse_epoch_bytes(dates: np.ndarray) -> np.ndarray:
+    # Same as parse_epochs for an array of ASCII encoded dates, without building a list of strings when they end in Z
+    text: np.ndarray = dates.astype('U')
+    if np.all(np.char.endswith(text, 'Z')):
+        return np.char.rstrip(text, 'Z').astype('datetime64[us]').astype(np.int64)
+    return parse_epochs(text.tolist())
+
+
+class IsoDates(object):
+    """
+    Original ISO strings of the lightning dates stored as fixed width ASCII bytes, decoded only when one is read.
+    """
+    def __init__(self, values: np.ndarray):
+        self.values: np.ndarray = values
+
+    @classmethod
+    def from_strings(cls, dates: List[str]) -> 'IsoDates':
+        return cls(np.array([date.encode('ascii') for date in dates], dtype='S32'))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, position: int) -> str:
+        return self.values[position].decode('ascii')
+
+    def __iter__(self) -> Iterator[str]:
+        for value in self.values:
+            yield value.decode('ascii')
+
+
+class LightningColumns(object):
+    """
+    Lightnings of a downloaded list stored column by column. Dates are parsed once to microseconds since epoch, and the
+    original ISO strings are kept to be written in the outputs.
+    """
+    def __init__(self, ids: np.ndarray, meteocat_ids: np.ndarray, epoch: np.ndarray, x: np.ndarray, y: np.ndarray,
+                 peak_current: np.ndarray, chi_squared: np.ndarray, number_of_sensors: np.ndarray,
+                 hit_ground: np.ndarray, dates: IsoDates):
+        self.ids: np.ndarray = ids
+        self.meteocat_ids: np.ndarray = meteocat_ids
+        self.epoch: np.ndarray = epoch
+        self.x: np.ndarray = x
+        self.y: np.ndarray = y
+        self.peak_current: np.ndarray = peak_current
+        self.chi_squared: np.ndarray = chi_squared
+        self.number_of_sensors: np.ndarray = number_of_sensors
+        self.hit_ground: np.ndarray = hit_ground
+        self.dates: IsoDates = dates
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @classmethod
+    def from_lightnings(cls, lightnings: List[Dict[str, Any]]) -> 'LightningColumns':
+        dates: List[str] = [lightning['date'] for lightning in lightnings]
+        return cls(np.array([lightning['id'] for lightning in lightnings], dtype=np.int64),
+                   np.array([lightning['meteocat_id'] for lightning in lightnings], dtype=np.int64),
+                   parse_epochs(dates),
+                   np.array([lightning['coordinates_x'] for lightning in lightnings], dtype=np.float64),
+                   np.array([lightning['coordinates_y'] for lightning in lightnings], dtype=np.float64),
+                   np.array([lightning.get('peak_current', np.nan) for lightning in lightnings], dtype=np.float64),
+                   np.array([lightning.get('chi_squared', np.nan) for lightning in lightnings], dtype=np.float64),
+                   np.array([lightning.get('number_of_sensors', 0) for lightning in lightnings], dtype=np.int64),
+                   np.array([bool(lightning.get('hit_ground', False)) for lightning in lightnings], dtype=bool),
+                   IsoDates.from_strings(dates))
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> 'LightningColumns':
+        # Columns are views of the fields of a LIGHTNING_DTYPE array, nothing is copied
+        return cls(records['id'], records['meteocat_id'], records['epoch'], records['x'], records['y'],
+                   records['peak_current'], records['chi_squared'], records['number_of_sensors'],
+                   records['hit_ground'], IsoDates(records['date']))
+
+    @classmethod
+    def concatenate(cls, columns: List['LightningColumns']) -> 'LightningColumns':
+        if len(columns) == 0:
+            return cls.from_lightnings([])
+        return cls(np.concatenate([column.ids for column in columns]),
+                   np.concatenate([column.meteocat_ids for column in columns]),
+                   np.concatenate([column.epoch for column in columns]),
+                   np.concatenate([column.x for column in columns]),
+                   np.concatenate([column.y for column in columns]),
+                   np.concatenate([column.peak_current for column in columns]),
+                   np.concatenate([column.chi_squared for column in columns]),
+                   np.concatenate([column.number_of_sensors for column in columns]),
+                   np.concatenate([column.hit_ground for column in columns]),
+                   IsoDates(np.concatenate([column.dates.values for column in columns])))
+
+    def record(self, position: int) -> 'LightningRecord':
+        return LightningRecord(self, position)
+
+    def take(self, indices: np.ndarray) -> 'LightningColumns':
+        return LightningColumns(self.ids[indices], self.meteocat_ids[indices], self.epoch[indices], self.x[indices],
+                                self.y[indices], self.peak_current[indices], self.chi_squared[indices],
+                                self.number_of_sensors[indices], self.hit_ground[indices],
+                                IsoDates(self.dates.values[indices]))
+
+
+class LightningRecord(object):
+    """
+    One lightning of a LightningColumns read in place from its row, so keeping a lightning does not copy it. Fields are
+    converted to Python types when read and the ISO date string is only decoded when it is asked.
+    """
+    __slots__ = ('columns', 'position')
+
+    def __init__(self, columns: LightningColumns, position: int):
+        self.columns: LightningColumns = columns
+        self.position: int = position
+
+    @classmethod
+    def from_lightning(cls, lightning: Dict[str, Any]) -> 'LightningRecord':
+        # Record of a single lightning answered by the API
+        return cls(LightningColumns.from_lightnings([lightning]), 0)
+
+    @property
+    def id(self) -> int:
+        return int(self.columns.ids[self.position])
+
+    @property
+    def meteocat_id(self) -> int:
+        return int(self.columns.meteocat_ids[self.position])
+
+    @property
+    def epoch(self) -> int:
+        return int(self.columns.epoch[self.position])
+
+    @property
+    def x(self) -> float:
+        return float(self.columns.x[self.position])
+
+    @property
+    def y(self) -> float:
+        return float(self.columns.y[self.position])
+
+    @property
+    def peak_current(self) -> float:
+        return float(self.columns.peak_current[self.position])
+
+    @property
+    def chi_squared(self) -> float:
+        return float(self.columns.chi_squared[self.position])
+
+    @property
+    def number_of_sensors(self) -> int:
+        return int(self.columns.number_of_sensors[self.position])
+
+    @property
+    def hit_ground(self) -> bool:
+        return bool(self.columns.hit_ground[self.position])
+
+    @property
+    def date(self) -> str:
+        return self.columns.dates[self.position]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from typing import Tuple
+
+import numpy as np
+
+from lightning_columns import LightningColumns
+from lightning_columns import MICROSECONDS
+
+
+class LightningIndex(object):
+    """
+    Index of the lightnings of a search window to find the ones that precede a firefighter record within a maximum
+    cost, where the cost is sqrt(dx^2 + dy^2 + (dt / time_divider)^2) with dt in seconds. Lightnings are kept sorted
+    by time, so a query only evaluates the slice of lightnings that can be under the cost radius.
+    """
+    def __init__(self, x: np.ndarray, y: np.ndarray, epoch: np.ndarray):
+        self.size: int = len(epoch)
+        self._order: np.ndarray = np.argsort(epoch, kind='stable')
+        self._epoch: np.ndarray = np.asarray(epoch, dtype=np.int64)[self._order]
+        self._x: np.ndarray = np.asarray(x, dtype=np.float64)[self._order]
+        self._y: np.ndarray = np.asarray(y, dtype=np.float64)[self._order]
+
+    @classmethod
+    def from_columns(cls, columns: LightningColumns) -> 'LightningIndex':
+        return cls(columns.x, columns.y, columns.epoch)
+
+    def query(self, x: float, y: float, epoch: int, time_divider: float,
+              max_cost: float) -> Tuple[np.ndarray, np.ndarray]:
+        # Only lightnings strictly before the record and closer in time than the cost radius can be candidates
+        lower: int = int(np.searchsorted(self._epoch, epoch - int(np.ceil(max_cost * time_divider * MICROSECONDS)),
+                                         side='left'))
+        upper: int = int(np.searchsorted(self._epoch, epoch, side='left'))
+        diff_time: np.ndarray = (epoch - self._epoch[lower:upper]) / MICROSECONDS
+        cost: np.ndarray = np.sqrt((x - self._x[lower:upper]) ** 2 + (y - self._y[lower:upper]) ** 2 +
+                                   (diff_time / time_divider) ** 2)
+        selected: np.ndarray = np.nonzero(cost < max_cost)[0]
+        indices: np.ndarray = self._order[lower:upper][selected]
+        cost = cost[selected]
+        # Sort by cost and, on ties, by the original position to keep the order of a stable sort over the input list
+        order: np.ndarray = np.lexsort((indices, cost))
+        return indices[order], cost[order]
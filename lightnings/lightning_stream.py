@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import codecs
+import datetime
+import json
+import re
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Pattern
+from typing import Union
+
+import numpy as np
+import requests
+
+import meteocat_client
+from lightning_columns import LIGHTNING_DTYPE
+from lightning_columns import LightningColumns
+from lightning_columns import parse_epoch_bytes
+
+CHUNK_SIZE: int = 65536
+INITIAL_ROWS: int = 4096
+
+_WHITESPACE: Pattern = re.compile(r'\s*')
+
+
+def _grow(records: np.ndarray) -> np.ndarray:
+    grown: np.ndarray = np.zeros(2 * len(records), dtype=LIGHTNING_DTYPE)
+    grown[:len(records)] = records
+    return grown
+
+
+def _store(records: np.ndarray, row: int, lightning: Dict[str, Any]) -> None:
+    # Missing values take the defaults of LightningColumns.from_lightnings
+    peak_current: Union[float, None] = lightning.get('peak_current')
+    chi_squared: Union[float, None] = lightning.get('chi_squared')
+    records[row] = (lightning['id'], lightning['meteocat_id'], 0, lightning['coordinates_x'],
+                    lightning['coordinates_y'], np.nan if peak_current is None else peak_current,
+                    np.nan if chi_squared is None else chi_squared, lightning.get('number_of_sensors', 0),
+                    bool(lightning.get('hit_ground', False)), lightning['date'].encode('ascii'))
+
+
+def decode_lightnings(chunks: Iterable[bytes]) -> np.ndarray:
+    """
+    Lightnings of a JSON list read chunk by chunk into a LIGHTNING_DTYPE array. Each lightning is decoded on its own and
+    stored in its row, so only one of them exists as a dict at a time and the memory used is the one of the rows and of
+    the chunk being decoded.
+    """
+    decoder: json.JSONDecoder = json.JSONDecoder()
+    text_decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder('utf-8')()
+    records: np.ndarray = np.zeros(INITIAL_ROWS, dtype=LIGHTNING_DTYPE)
+    count: int = 0
+    buffer: str = ''
+    started: bool = False
+    finished: bool = False
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        position: int = 0
+        while not finished:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            character: str = buffer[position]
+            if not started:
+                if character != '[':
+                    raise ValueError('The lightnings are not a JSON list')
+                started = True
+                position += 1
+            elif character == ',':
+                position += 1
+            elif character == ']':
+                finished = True
+                position += 1
+            else:
+                try:
+                    lightning, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The lightning continues in the next chunk
+                    break
+                if count == len(records):
+                    records = _grow(records)
+                _store(records, count, lightning)
+                count += 1
+                position = end
+        buffer = buffer[position:]
+    buffer += text_decoder.decode(b'', final=True)
+    if not finished or buffer.strip() != '':
+        raise ValueError('The lightnings list is incomplete or followed by other data')
+    records = records[:count].copy()
+    records['epoch'] = parse_epoch_bytes(records['date'])
+    return records
+
+
+def download_columns(url: str, username: str, token: str) -> Union[LightningColumns, None]:
+    # Lightnings of a list endpoint decoded while they are received, None when the API does not answer them
+    response: requests.Response = meteocat_client.get(url, username, token, stream=True)
+    try:
+        if response.status_code != 200:
+            return None
+        return LightningColumns.from_records(decode_lightnings(response.iter_content(CHUNK_SIZE)))
+    finally:
+        response.close()
+
+
+def download_day_columns(day: datetime.date, grouped: bool, host: str, username: str, token: str) -> Union[LightningColumns, None]:
+    route: str = 'grouped_by_discharges/' if grouped else ''
+    return download_columns("{}/meteocat/lightning/{}{}/{}/{}?srid=25831".format(host, route, day.year, day.month,
+                                                                                 day.day), username, token)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Compares the streamed decoding of a day with the decoding of the whole response
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--day', help='Day to check as YYYY-MM-DD')
+    parser.add_argument('-H', '--host', help='Host name were the database cluster is located')
+    parser.add_argument('-u', '--username', help='Database username')
+    parser.add_argument('-t', '--token', help='Database password')
+    meteocat_client.add_arguments(parser)
+    args = parser.parse_args()
+    meteocat_client.configure_from_arguments(args)
+
+    day: datetime.date = datetime.date.fromisoformat(args.day)
+    url: str = "{}/meteocat/lightning/{}/{}/{}?srid=25831".format(args.host, day.year, day.month, day.day)
+    start: float = time.perf_counter()
+    body: bytes = meteocat_client.get(url, args.username, args.token).content
+    expected: LightningColumns = LightningColumns.from_lightnings(json.loads(body))
+    whole_time: float = time.perf_counter() - start
+    start = time.perf_counter()
+    found: Union[LightningColumns, None] = download_columns(url, args.username, args.token)
+    stream_time: float = time.perf_counter() - start
+    equal: bool = found is not None and len(found) == len(expected) and all(
+        np.array_equal(getattr(found, name), getattr(expected, name), equal_nan=name in ('peak_current', 'chi_squared'))
+        for name in ['ids', 'meteocat_ids', 'epoch', 'x', 'y', 'peak_current', 'chi_squared', 'number_of_sensors',
+                     'hit_ground']) and np.array_equal(found.dates.values, expected.dates.values)
+    print('{} lightnings, whole response {:.3f} s, streamed {:.3f} s, {}'.format(
+        len(expected), whole_time, stream_time, 'equal' if equal else 'DIFFERENT'))
+    meteocat_client.close()
@@ -2,70 +2,161 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-import dateutil.parser
 import json
 import argparse
 import csv
-from requests.auth import HTTPBasicAuth
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import Tuple
 from typing import Union
 
 import pytz
 import requests
-import math
 
+import lightning_stream
+import meteocat_client
+import run_metrics
+from batch_client import BatchLookup
+from batch_client import MAXIMUM_BATCH_SIZE
+from batch_client import download_land_covers
+from land_cover_raster import LandCoverRaster
+from day_window import DayWindow
+from lightning_columns import LightningColumns
+from lightning_columns import to_epoch
+from lightning_index import LightningIndex
 
-def download_lightnings(requested_day: datetime.datetime, host: str, username: str, token: str) -> Union[List[Dict[str, Any]], None]:
-    year: int = requested_day.year
-    month: int = requested_day.month
-    day: int = requested_day.day
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
-    url: str = "{}/meteocat/lightning/{}/{}/{}?srid=25831".format(host, year, month, day)
-    response: requests.Response = requests.get(url, auth=auth)
-    if response.status_code == 200:
-        return json.loads(response.text)
-    else:
-        return None
-
-
-def download_grouped_lightnings(requested_day: datetime.datetime, host: str, username: str, token: str) -> Union[List[Dict[str, Any]], None]:
-    year: int = requested_day.year
-    month: int = requested_day.month
-    day: int = requested_day.day
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
-    url: str = "{}/meteocat/lightning/grouped_by_discharges/{}/{}/{}?srid=25831".format(host, year, month, day)
-    response: requests.Response = requests.get(url, auth=auth)
-    if response.status_code == 200:
-        return json.loads(response.text)
-    else:
-        return None
+MAXIMUM_COST: float = 15000
+DAYS_TO_SEARCH: int = 6
 
 
 def get_land_cover(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/land_cover/{}".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
-        print(json.loads(response.text), identifier)
         return json.loads(response.text)
     else:
         return None
 
 
 def get_discharges(identifier: int, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
-    auth: HTTPBasicAuth = HTTPBasicAuth(username, token)
     url: str = "{}/meteocat/lightning/discharge_count/{}".format(host, identifier)
-    response: requests.Response = requests.get(url, auth=auth)
+    response: requests.Response = meteocat_client.get(url, username, token)
     if response.status_code == 200:
-        print(json.loads(response.text), identifier)
         return json.loads(response.text)
     else:
         print(response.text)
         return None
 
 
+def download_day_columns(day: datetime.date, matching_type: str, host: str, username: str, token: str) -> Union[LightningColumns, None]:
+    # The day is decoded while it is received, without building the list of lightnings
+    if matching_type not in ('individual', 'combined'):
+        return None
+    return lightning_stream.download_day_columns(day, matching_type == 'combined', host, username, token)
+
+
+def match_records(records: List[List[Any]], args: argparse.Namespace, land_cover_raster: Union[LandCoverRaster, None]) -> List[List[Any]]:
+    # Records are sorted, so the searched days are kept in a window that only moves forward
+    window: DayWindow = DayWindow(DAYS_TO_SEARCH, lambda day: download_day_columns(day, args.type, args.host,
+                                                                                   args.username, args.token))
+    lightnings: LightningColumns = LightningColumns.from_lightnings([])
+    index: Union[LightningIndex, None] = None
+    matched_lightnings: List[List[Any]] = list()
+    run_metrics.start_records()
+    for lightning in records:
+        with run_metrics.stage('download'):
+            moved: bool = window.move_to(lightning[0].date())
+            if moved:
+                lightnings = LightningColumns.concatenate([day_lightnings for _, day_lightnings in window.days()])
+        if moved:
+            with run_metrics.stage('cost'):
+                index = LightningIndex.from_columns(lightnings)
+        print(lightning[0], len(lightnings))
+        computed_cost_lightnings = list()
+        if len(lightnings) > 0:
+            # print(len(lightnings))
+            with run_metrics.stage('cost'):
+                candidates, costs = index.query(lightning[1], lightning[2], to_epoch(lightning[0]), args.time_divider,
+                                                MAXIMUM_COST)  # / (1 + ((possible_discharges - 1) / 4))
+                # (cost, row index) pairs, the lightnings stay in the columns
+                computed_cost_lightnings = [(float(cost), int(candidate)) for candidate, cost in zip(candidates, costs)]
+
+            with run_metrics.stage('enrichment'):
+                # Land covers of all the candidates in one lookup, None where the API has to be asked
+                land_covers: List[Union[Dict[str, Any], None]] = [None] * len(candidates)
+                if land_cover_raster is not None:
+                    land_covers = land_cover_raster.land_covers(lightnings.x[candidates], lightnings.y[candidates])
+                land_lookup: Union[BatchLookup, None] = None
+                if args.batch_size > 0:
+                    land_lookup = BatchLookup(lambda chunk: download_land_covers(chunk, args.host, args.username,
+                                                                                 args.token, args.batch_size),
+                                              [int(i) for i in lightnings.ids[candidates]], args.batch_size)
+
+                if len(computed_cost_lightnings) > 0:
+                    lightning_max = None
+                    distance_max = None
+                    land_cover = None
+                    discharges_max = None
+                    for order, ((cost, row), land) in enumerate(zip(computed_cost_lightnings, land_covers)):
+                        identifier = int(lightnings.ids[row])
+                        if land is None and land_lookup is not None:
+                            land = land_lookup.get(order)
+                        if land is None:
+                            land = get_land_cover(identifier, args.host, args.username, args.token)
+                        if land is None:
+                            print('Land cover not found!', identifier)
+                            break
+                        land_cover = int(land['land_cover_type'])
+                        if 0 < land_cover < 300:
+                            discharges = get_discharges(identifier, args.host, args.username, args.token)
+                            if discharges is None:
+                                print('discharges not found!', identifier)
+                                break
+                            discharges_max = int(discharges['count'])
+                            lightning_max = lightnings.record(row)
+                            distance_max = cost
+                            break
+                    if lightning_max is not None:
+                        date_in_utc: datetime.datetime = lightning[0].astimezone(pytz.utc)
+                        new_row = [lightning_max.id, lightning_max.meteocat_id, discharges_max, lightning_max.date,
+                                   lightning_max.x, lightning_max.y, land_cover, distance_max,
+                                   date_in_utc.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), lightning[1], lightning[2]]
+                        matched_lightnings.append(new_row)
+                else:
+                    print('No match')
+        run_metrics.record()
+    return matched_lightnings
+
+
+def match_range(records: List[List[Any]], args: argparse.Namespace) -> Tuple[List[List[Any]], Dict[str, Any]]:
+    # Worker process matching a contiguous range of the records with its own connections and day window, the metrics
+    # of the worker are returned with the matched lightnings
+    meteocat_client.configure_from_arguments(args)
+    land_cover_raster: Union[LandCoverRaster, None] = None
+    if args.land_cover_file is not None:
+        land_cover_raster = LandCoverRaster.load(args.land_cover_file)
+    matched_lightnings: List[List[Any]] = match_records(records, args, land_cover_raster)
+    meteocat_client.close()
+    return matched_lightnings, run_metrics.snapshot()
+
+
+def split_records(records: List[List[Any]], parts: int) -> List[List[List[Any]]]:
+    # Contiguous ranges of about the same number of sorted records, a day is never split between two ranges
+    ranges: List[List[List[Any]]] = list()
+    start: int = 0
+    for part in range(1, parts + 1):
+        end: int = max(start, len(records) * part // parts)
+        while 0 < end < len(records) and records[end][0].date() == records[end - 1][0].date():
+            end += 1
+        if end > start:
+            ranges.append(records[start:end])
+        start = end
+    return ranges
+
+
 if __name__ == "__main__":  # pragma: no cover
     # Config the program arguments
     # noinspection DuplicatedCode
@@ -78,8 +169,21 @@ if __name__ == "__main__":  # pragma: no cover
     parser.add_argument('-y', '--type', help='Type of matching algorithm: individual, combined', default='individual')
     parser.add_argument('-f', '--time-divider', help='Time divider on the time component cost: 1=seconds, 60=minutes', default=1, type=float)
 
+    parser.add_argument('--land-cover-file', help='Memory mapped land cover raster used instead of the API',
+                        default=None)
+    parser.add_argument('-b', '--batch-size', help='Ask land covers and discharge counts in batches of this many '
+                                                   'lightnings, at most {}, 0 asks one lightning per '
+                                                   'request'.format(MAXIMUM_BATCH_SIZE), default=0, type=int)
+    parser.add_argument('-w', '--workers', help='Number of processes matching contiguous date ranges of the records',
+                        default=1, type=int)
+    meteocat_client.add_arguments(parser)
+    run_metrics.add_arguments(parser)
     # noinspection DuplicatedCode
     args = parser.parse_args()
+    meteocat_client.configure_from_arguments(args)
+    land_cover_raster: Union[LandCoverRaster, None] = None
+    if args.land_cover_file is not None:
+        land_cover_raster = LandCoverRaster.load(args.land_cover_file)
 
     # Load firefighters records
     csv_lightnings: List[List[str]] = list()
@@ -102,68 +206,22 @@ if __name__ == "__main__":  # pragma: no cover
         filtered_lightnings.append(new_row)
     filtered_lightnings.sort(key=lambda l: l[0])
 
-    days_to_search: List[datetime.datetime] = list()
     matched_lightnings = list()
     matched_lightnings.append(['id', 'meteocat_id', 'discharges', 'date-UTC', 'x', 'y', 'land_cover', 'weight', 'date-UTC-ff', 'x-ff', 'y-ff'])
-    for lightning in filtered_lightnings:
-        days_to_search = [lightning[0] - datetime.timedelta(days=day) for day in range(6)]
-        lightnings: List[Dict[str, Any]] = list()
-        for day in days_to_search:
-            if args.type == 'individual':
-                lightnings += download_lightnings(datetime.datetime(day.year, day.month, day.day, 0, 0, 0), args.host,
-                                                  args.username, args.token)
-            elif args.type == 'combined':
-                lightnings += download_grouped_lightnings(datetime.datetime(day.year, day.month, day.day, 0, 0, 0),
-                                                          args.host, args.username, args.token)
-        print(lightning[0], len(lightnings))
-        computed_cost_lightnings = list()
-        if lightnings is not None and len(lightnings) > 0:
-            # print(len(lightnings))
-            distance_max = 10000000000
-            lightning_max = None
-            for possible in lightnings:
-                possible_date = dateutil.parser.isoparse(possible['date'])
-                possible_x = possible['coordinates_x']
-                possible_y = possible['coordinates_y']
-
-                diff_time: datetime.timedelta = lightning[0] - possible_date
-
-                if diff_time.total_seconds() > 0:
-                    distance = math.sqrt((lightning[1] - possible_x)**2 + (lightning[2] - possible_y)**2 + (diff_time.total_seconds() / (args.time_divider))**2)  # / (1 + ((possible_discharges - 1) / 4))
-                    if distance < 15000:
-                        computed_cost_lightnings.append([distance, possible.copy()])
-
-            if len(computed_cost_lightnings) > 0:
-                computed_cost_lightnings.sort(key=lambda l: l[0])
-                lightning_max = None
-                distance_max = None
-                land_cover = None
-                discharges_max = None
-                for computed_lightning in computed_cost_lightnings:
-                    land = get_land_cover(computed_lightning[1]['id'], args.host, args.username, args.token)
-                    if land is None:
-                        print('Land cover not found!', computed_lightning[1]['id'])
-                        break
-                    land_cover = int(land['land_cover_type'])
-                    if 0 < land_cover < 300:
-                        discharges = get_discharges(computed_lightning[1]['id'], args.host, args.username, args.token)
-                        if discharges is None:
-                            print('discharges not found!', computed_lightning[1]['id'])
-                            break
-                        discharges_max = int(discharges['count'])
-                        lightning_max = computed_lightning[1]
-                        distance_max = computed_lightning[0]
-                        break
-                if lightning_max is not None:
-                    date_in_utc: datetime.datetime = lightning[0].astimezone(pytz.utc)
-                    new_row = [lightning_max['id'], lightning_max['meteocat_id'], discharges_max, lightning_max['date'],
-                               lightning_max['coordinates_x'], lightning_max['coordinates_y'], land_cover, distance_max,
-                               date_in_utc.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), lightning[1], lightning[2]]
-                    matched_lightnings.append(new_row)
-            else:
-                print('No match')
-
-    with open(args.output_file, 'w') as file:
-        writer = csv.writer(file)
-        writer.writerows(matched_lightnings)
+    if args.workers > 1:
+        # Ranges are matched in parallel and joined in their order, so the output is the one of a serial run
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for matched_range, metrics in executor.map(match_range, split_records(filtered_lightnings, args.workers),
+                                                       itertools.repeat(args)):
+                matched_lightnings += matched_range
+                run_metrics.merge(metrics)
+    else:
+        matched_lightnings += match_records(filtered_lightnings, args, land_cover_raster)
+
+    with run_metrics.stage('write'):
+        with open(args.output_file, 'w') as file:
+            writer = csv.writer(file)
+            writer.writerows(matched_lightnings)
 
+    meteocat_client.close()
+    run_metrics.report(args.metrics_file)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from lightning_columns import to_epoch
+
+_store: Union['MeasureStore', None] = None
+
+Key = Tuple[str, str, int, int]
+
+
+class MeasureStore(object):
+    """
+    Persistent store of the weather measures asked to the API, keyed by station, variable, date (microseconds since
+    epoch) and window of previous days, stored in a SQLite file that can be shared by all the fill scripts. Requests of
+    a key that is already being asked by another thread wait for its answer instead of asking it again. Measures the
+    API does not have are only remembered during the run, as the API answers the same to a failed request. Answers
+    are stored as their JSON text, so a stored answer is the one of the API down to the type and the sign of zero.
+    """
+    def __init__(self, filename: str):
+        self.filename: str = filename
+        self.hits: int = 0
+        self.merged: int = 0
+        self.fetched: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._pending: Dict[Key, Future] = dict()
+        self._missing: Set[Key] = set()
+        # The file can be shared between several scripts or processes running at the same time
+        self._connection: sqlite3.Connection = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS measure_answers (station TEXT NOT NULL, "
+                                 "variable TEXT NOT NULL, date INTEGER NOT NULL, window INTEGER NOT NULL, "
+                                 "answer TEXT NOT NULL, PRIMARY KEY (station, variable, date, window))")
+        self._connection.commit()
+
+    def get(self, key: Key, fetch: Callable[[], Union[Dict[str, Any], None]]) -> Union[Dict[str, Any], None]:
+        with self._lock:
+            row: Union[Tuple[str], None] = self._connection.execute(
+                "SELECT answer FROM measure_answers WHERE station = ? AND variable = ? AND date = ? AND window = ?",
+                key).fetchone()
+            if row is not None:
+                self.hits += 1
+                return json.loads(row[0])
+            if key in self._missing:
+                self.hits += 1
+                return None
+            future: Union[Future, None] = self._pending.get(key)
+            if future is not None:
+                self.merged += 1
+            else:
+                self._pending[key] = Future()
+        if future is not None:
+            return future.result()
+        future = self._pending[key]
+        try:
+            measure: Union[Dict[str, Any], None] = fetch()
+        except BaseException as exception:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(exception)
+            raise
+        with self._lock:
+            self.fetched += 1
+            if measure is None:
+                self._missing.add(key)
+            else:
+                self._connection.execute("INSERT OR REPLACE INTO measure_answers (station, variable, date, window, "
+                                         "answer) VALUES (?, ?, ?, ?, ?)", key + (json.dumps(measure), ))
+                self._connection.commit()
+            del self._pending[key]
+        future.set_result(measure)
+        return measure
+
+    def print_statistics(self) -> None:
+        print('Measure store: {} read from the store, {} merged with a running request, {} asked to the API'.format(
+            self.hits, self.merged, self.fetched))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def configure(store: Union[MeasureStore, None]) -> None:
+    global _store
+    _store = store
+
+
+def add_arguments(parser) -> None:
+    parser.add_argument('--measure-store', help='SQLite file storing the weather measures asked to the API, it can be '
+                                                'shared by all the fill scripts', default=None)
+
+
+def configure_from_arguments(args) -> None:
+    if args.measure_store is not None:
+        configure(MeasureStore(args.measure_store))
+
+
+def close() -> None:
+    if _store is not None:
+        _store.print_statistics()
+        _store.close()
+        configure(None)
+
+
+def get_measure(measure: Callable[[datetime.date, int, str, str, str, str], Union[Dict[str, Any], None]], variable: str, date: datetime.datetime, window: int, station_code: str, host: str, username: str, token: str) -> Union[Dict[str, Any], None]:
+    # Same answer as the measure getter, read from the store when it is configured
+    store: Union[MeasureStore, None] = _store
+    if store is None:
+        return measure(date, window, station_code, host, username, token)
+    return store.get((str(station_code), variable, to_epoch(date), window),
+                     lambda: measure(date, window, station_code, host, username, token))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import urllib.parse
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import requests
+
+import run_metrics
+from response_cache import ResponseCache
+
+DEFAULT_POOL_SIZE: int = 10
+DEFAULT_CONNECT_TIMEOUT: float = 10.0
+DEFAULT_READ_TIMEOUT: float = 120.0
+
+_lock: threading.Lock = threading.Lock()
+_sessions: Dict[Tuple[str, str], requests.Session] = dict()
+_pool_size: int = DEFAULT_POOL_SIZE
+_timeout: Tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+_cache: Union[ResponseCache, None] = None
+
+DEFAULT_CACHE_SIZE: int = 2048  # MB
+ENDPOINTS: List[str] = ['lightning_day', 'grouped_lightning_day', 'lightning', 'land_cover', 'discharge_count',
+                        'nearest_station', 'measure']
+
+
+def configure(pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+              read_timeout: float = DEFAULT_READ_TIMEOUT) -> None:
+    global _pool_size, _timeout
+    with _lock:
+        _pool_size = pool_size
+        _timeout = (connect_timeout, read_timeout)
+        # Sessions created with the old pool size are discarded
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def configure_cache(cache: Union[ResponseCache, None]) -> None:
+    global _cache
+    _cache = cache
+
+
+def get_cache() -> Union[ResponseCache, None]:
+    return _cache
+
+
+def endpoint_of(url: str) -> str:
+    parts: List[str] = [part for part in urllib.parse.urlsplit(url).path.split('/') if part != '']
+    if 'station' in parts:
+        return 'nearest_station'
+    if 'measure' in parts:
+        return 'measure'
+    for endpoint, route in [('grouped_lightning_day', 'grouped_by_discharges'), ('land_cover', 'land_cover'),
+                            ('discharge_count', 'discharge_count')]:
+        if route in parts:
+            return endpoint
+    if len(parts) >= 3 and parts[-3].isdigit():
+        return 'lightning_day'
+    return 'lightning'
+
+
+def cache_key(url: str) -> str:
+    # The host is not part of the key so the same cache can be used against any mirror of the API
+    split: urllib.parse.SplitResult = urllib.parse.urlsplit(url)
+    return split.path + '?' + split.query if split.query != '' else split.path
+
+
+def parse_ttls(values: Union[List[str], None]) -> Dict[str, Union[float, None]]:
+    ttls: Dict[str, Union[float, None]] = dict()
+    for value in [] if values is None else values:
+        endpoint, _, seconds = value.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise ValueError('Unknown endpoint {} in cache TTL, valid ones are {}'.format(endpoint, ', '.join(ENDPOINTS)))
+        ttls[endpoint] = None if seconds in ('', 'none', 'never') else float(seconds)
+    return ttls
+
+
+def add_arguments(parser) -> None:
+    parser.add_argument('--pool-size', help='Number of keep-alive connections kept to the API host',
+                        default=DEFAULT_POOL_SIZE, type=int)
+    parser.add_argument('--connect-timeout', help='Seconds to wait for a connection to the API host',
+                        default=DEFAULT_CONNECT_TIMEOUT, type=float)
+    parser.add_argument('--read-timeout', help='Seconds to wait for an API response',
+                        default=DEFAULT_READ_TIMEOUT, type=float)
+    parser.add_argument('--cache-file', help='SQLite file used as persistent cache of the API responses', default=None)
+    parser.add_argument('--cache-size', help='Maximum size of the cached responses in MB', default=DEFAULT_CACHE_SIZE,
+                        type=int)
+    parser.add_argument('--cache-ttl', help='Time to live in seconds of an endpoint cached responses, e.g. '
+                                            'lightning_day=86400. Responses never expire by default',
+                        action='append', default=None)
+
+
+def configure_from_arguments(args) -> None:
+    configure(args.pool_size, args.connect_timeout, args.read_timeout)
+    if args.cache_file is not None:
+        configure_cache(ResponseCache(args.cache_file, args.cache_size * 1024 * 1024, parse_ttls(args.cache_ttl)))
+
+
+def close() -> None:
+    if _cache is not None:
+        _cache.print_statistics()
+        _cache.close()
+        configure_cache(None)
+
+
+def get_session(username: str, token: str) -> requests.Session:
+    key: Tuple[str, str] = (username, token)
+    with _lock:
+        session: Union[requests.Session, None] = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.auth = HTTPBasicAuth(username, token)
+            adapter: HTTPAdapter = HTTPAdapter(pool_connections=_pool_size, pool_maxsize=_pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+def _cached_response(url: str, body: bytes) -> requests.Response:
+    response: requests.Response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = 'utf-8'
+    response._content = body
+    # The body is already read, so iter_content and close work as on a streamed response
+    response._content_consumed = True
+    return response
+
+
+def _request(url: str, endpoint: str, username: str, token: str, stream: bool = False) -> requests.Response:
+    start: float = time.perf_counter()
+    try:
+        response: requests.Response = get_session(username, token).get(url, timeout=_timeout, stream=stream)
+    except requests.RequestException:
+        run_metrics.record_request(endpoint, time.perf_counter() - start, 0, 0)
+        raise
+    # The body of a streamed response is not read yet, its size is the announced one
+    size: int = int(response.headers.get('Content-Length', 0)) if stream else len(response.content)
+    run_metrics.record_request(endpoint, time.perf_counter() - start, response.status_code, size)
+    return response
+
+
+def get(url: str, username: str, token: str, stream: bool = False) -> requests.Response:
+    # A streamed response is read with iter_content and must be closed, with the cache the body is always read to be
+    # stored
+    cache: Union[ResponseCache, None] = _cache
+    endpoint: str = endpoint_of(url)
+    if cache is None:
+        return _request(url, endpoint, username, token, stream)
+    key: str = cache_key(url)
+    body: Union[bytes, None] = cache.get(endpoint, key)
+    if body is not None:
+        run_metrics.record_request(endpoint, 0.0, 200, len(body), cached=True)
+        return _cached_response(url, body)
+    response: requests.Response = _request(url, endpoint, username, token)
+    # Only successful responses are stored, errors and missing data are asked again on the next run
+    if response.status_code == 200:
+        cache.put(endpoint, key, response.content)
+    return response
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import functools
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Pattern
+from typing import Tuple
+from typing import Union
+
+LAND_COVER_TYPES: List[int] = [111, 112, 121, 211, 221, 224, 231, 311, 312, 313, 321, 324, 332, 333, 511]
+# Area covered by the generated lightnings and stations (ETRS89 UTM 31N)
+AREA: Tuple[float, float, float, float] = (260000, 4490000, 520000, 4740000)
+# Lightning identifiers are the day ordinal times this plus the position of the lightning in its day
+DAY_IDENTIFIERS: int = 100000
+VARIABLES: Dict[str, Tuple[float, float]] = {'HR': (20, 100), 'T': (-5, 40), 'PPT': (0, 20), 'RS': (0, 1000),
+                                             'VV10': (0, 15)}
+
+
+def _hash(*values: Any) -> int:
+    return zlib.crc32(repr(values).encode('utf-8'))
+
+
+# The discharges of a day are grouped in flashes: a discharge closer than these seconds and meters to the previous one
+# of the day belongs to its flash, the grouped list has the first discharge of each flash
+FLASH_SECONDS: float = 0.5
+FLASH_DISTANCE: float = 10000
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return min(max(value, low), high)
+
+
+@functools.lru_cache(maxsize=256)
+def _day_lightnings(seed: int, ordinal: int, lightnings_per_day: int) -> Tuple[Dict[str, Any], ...]:
+    # Flashes of 1 to 4 discharges of a day grouped in storm cells, sorted by date as the API returns them
+    generator: random.Random = random.Random(seed * 1000003 + ordinal)
+    day: datetime.datetime = datetime.datetime.fromordinal(ordinal)
+    cells: List[Tuple[float, float, float]] = [
+        (generator.uniform(AREA[0], AREA[2]), generator.uniform(AREA[1], AREA[3]), generator.uniform(3600, 82800))
+        for _ in range(1 + lightnings_per_day // 100)]
+    lightnings: List[Dict[str, Any]] = list()
+    while len(lightnings) < lightnings_per_day:
+        x, y, seconds = generator.choice(cells)
+        # Flashes start a second away from midnight and last less than one, so no flash spans two days
+        seconds = _clamp(seconds + generator.gauss(0, 1800), 1, 86398)
+        x = _clamp(x + generator.gauss(0, 5000), AREA[0], AREA[2])
+        y = _clamp(y + generator.gauss(0, 5000), AREA[1], AREA[3])
+        for _ in range(min(generator.choice([1, 1, 1, 2, 2, 3, 4]), lightnings_per_day - len(lightnings))):
+            date: datetime.datetime = day + datetime.timedelta(seconds=seconds)
+            identifier: int = ordinal * DAY_IDENTIFIERS + len(lightnings)
+            lightnings.append({'id': identifier, 'meteocat_id': identifier + 7,
+                               'date': date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), 'coordinates_x': x, 'coordinates_y': y,
+                               'peak_current': round(generator.uniform(-30, 30), 3),
+                               'chi_squared': round(generator.uniform(0, 5), 1),
+                               'number_of_sensors': generator.randint(2, 9), 'hit_ground': generator.random() < 0.6})
+            seconds += generator.uniform(0.01, 0.2)
+            x = _clamp(x + generator.uniform(-500, 500), AREA[0], AREA[2])
+            y = _clamp(y + generator.uniform(-500, 500), AREA[1], AREA[3])
+    lightnings.sort(key=lambda lightning: lightning['date'])
+    return tuple(lightnings)
+
+
+@functools.lru_cache(maxsize=256)
+def _day_flashes(seed: int, ordinal: int, lightnings_per_day: int) -> Tuple[Dict[int, int], Tuple[Dict[str, Any], ...]]:
+    # Discharges of the flash of each lightning of a day and the first lightning of each flash
+    counts: Dict[int, int] = dict()
+    firsts: List[Dict[str, Any]] = list()
+    flash: List[int] = list()
+    previous: Union[Tuple[datetime.datetime, float, float], None] = None
+    for lightning in _day_lightnings(seed, ordinal, lightnings_per_day):
+        current: Tuple[datetime.datetime, float, float] = (
+            datetime.datetime.strptime(lightning['date'], "%Y-%m-%dT%H:%M:%S.%fZ"), lightning['coordinates_x'],
+            lightning['coordinates_y'])
+        if previous is None or (current[0] - previous[0]).total_seconds() > FLASH_SECONDS or \
+                math.hypot(current[1] - previous[1], current[2] - previous[2]) > FLASH_DISTANCE:
+            counts.update((identifier, len(flash)) for identifier in flash)
+            flash = list()
+            firsts.append(lightning)
+        flash.append(lightning['id'])
+        previous = current
+    counts.update((identifier, len(flash)) for identifier in flash)
+    return counts, tuple(firsts)
+
+
+class StubData(object):
+    """
+    Deterministic answers of the stand-in server, generated from a seed at a configurable scale: lightnings_per_day
+    lightnings every day and stations weather stations. Values only depend on the seed and the identifiers asked, so the
+    per ID and the batch routes always agree and the lightning identifiers can be decoded back to their day.
+    """
+    def __init__(self, lightnings_per_day: int = 300, stations: int = 40, seed: int = 1):
+        if not 0 < lightnings_per_day < DAY_IDENTIFIERS:
+            raise ValueError('Lightnings per day must be between 1 and {}'.format(DAY_IDENTIFIERS - 1))
+        self.lightnings_per_day: int = lightnings_per_day
+        self.seed: int = seed
+        generator: random.Random = random.Random(seed)
+        self.stations: List[Dict[str, Any]] = [
+            {'code': 'S{:03d}'.format(k), 'coordinates_x': generator.uniform(AREA[0], AREA[2]),
+             'coordinates_y': generator.uniform(AREA[1], AREA[3])} for k in range(stations)]
+
+    def day_lightnings(self, day: datetime.date) -> List[Dict[str, Any]]:
+        return list(_day_lightnings(self.seed, day.toordinal(), self.lightnings_per_day))
+
+    def lightning(self, identifier: int) -> Union[Dict[str, Any], None]:
+        ordinal, position = divmod(identifier, DAY_IDENTIFIERS)
+        if ordinal < 1 or position >= self.lightnings_per_day:
+            return None
+        for lightning in _day_lightnings(self.seed, ordinal, self.lightnings_per_day):
+            if lightning['id'] == identifier:
+                return lightning
+        return None
+
+    def nearest_station(self, x: float, y: float) -> Union[Dict[str, Any], None]:
+        if len(self.stations) == 0:
+            return None
+        station: Dict[str, Any] = min(self.stations, key=lambda s: math.hypot(s['coordinates_x'] - x,
+                                                                               s['coordinates_y'] - y))
+        return {'code': station['code']}
+
+    def measure(self, station: str, variable: str, date: str, operation: Union[str, None] = None) -> Union[Dict[str, Any], None]:
+        if variable not in VARIABLES or (variable == 'VV10' and _hash(self.seed, station) % 2 == 1):
+            return None
+        low, high = VARIABLES[variable]
+        return {'value': round(low + (high - low) * (_hash(self.seed, station, variable, date, operation) % 1000) / 1000,
+                               1)}
+
+    def measures(self, station: str, variable: str, start: datetime.datetime, end: datetime.datetime) -> Union[List[Dict[str, Any]], None]:
+        # Hourly measures of the range
+        if self.measure(station, variable, start.isoformat()) is None:
+            return None
+        series: List[Dict[str, Any]] = list()
+        date: datetime.datetime = start.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        while date <= end:
+            text: str = date.strftime("%Y-%m-%dT%H:%M:%SZ")
+            series.append({'date': text, 'value': self.measure(station, variable, text)['value']})
+            date += datetime.timedelta(hours=1)
+        return series
+
+    def land_cover(self, identifier: int) -> Union[Dict[str, Any], None]:
+        return {'land_cover_type': LAND_COVER_TYPES[(identifier * 2654435761) % 4294967296 % len(LAND_COVER_TYPES)]}
+
+    def grouped_lightnings(self, day: datetime.date) -> List[Dict[str, Any]]:
+        return list(_day_flashes(self.seed, day.toordinal(), self.lightnings_per_day)[1])
+
+    def discharge_count(self, identifier: int) -> Union[Dict[str, Any], None]:
+        ordinal, position = divmod(identifier, DAY_IDENTIFIERS)
+        if ordinal < 1 or position >= self.lightnings_per_day:
+            return None
+        return {'count': _day_flashes(self.seed, ordinal, self.lightnings_per_day)[0][identifier]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are sent in a single write, otherwise keep-alive clients wait for delayed acknowledgements
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def send_json(self, status: int, content: Any) -> None:
+        body: bytes = json.dumps(content).encode('utf-8')
+        header: str = 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+            status, self.responses.get(status, ('', ))[0], len(body))
+        self.wfile.write(header.encode('latin-1') + body)
+
+    def do_GET(self) -> None:
+        server: 'MeteocatStubServer' = self.server
+        if server.latency > 0:
+            time.sleep(server.latency)
+        split: urllib.parse.SplitResult = urllib.parse.urlsplit(self.path)
+        query: Dict[str, str] = dict(urllib.parse.parse_qsl(split.query))
+        for pattern, route in server.routes:
+            match = pattern.fullmatch(split.path)
+            if match is not None:
+                server.count(route.__name__)
+                result: Union[Any, None] = route(query, *match.groups())
+                if result is None:
+                    self.send_json(404, {'detail': 'Not found'})
+                else:
+                    self.send_json(200, result)
+                return
+        self.send_json(404, {'detail': 'Unknown route'})
+
+
+class MeteocatStubServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the meteocat API used to test and benchmark the clients offline. Every request can be delayed
+    by a fixed latency to emulate the network.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, data: Union[StubData, None] = None):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.latency: float = latency
+        self.data: StubData = StubData() if data is None else data
+        self.requests: Dict[str, int] = dict()
+        self._lock: threading.Lock = threading.Lock()
+        self._thread: Union[threading.Thread, None] = None
+        self.routes: List[Tuple[Pattern, Callable[..., Union[Any, None]]]] = [
+            (re.compile(r'/meteocat/lightning/(\d+)/(\d+)/(\d+)'), self.day_lightnings),
+            (re.compile(r'/meteocat/lightning/grouped_by_discharges/(\d+)/(\d+)/(\d+)'), self.grouped_lightnings),
+            (re.compile(r'/meteocat/lightning/(\d+)'), self.lightning),
+            (re.compile(r'/meteocat/lightning/land_cover/(\d+)'), self.land_cover),
+            (re.compile(r'/meteocat/lightning/land_cover'), self.land_covers),
+            (re.compile(r'/meteocat/lightning/discharge_count/(\d+)'), self.discharge_count),
+            (re.compile(r'/meteocat/lightning/discharge_count'), self.discharge_counts),
+            (re.compile(r'/meteocat/station/nearest'), self.nearest_station),
+            (re.compile(r'/meteocat/data/measure/([^/]+)/([^/]+)'), self.measure),
+        ]
+
+    @property
+    def host(self) -> str:
+        return 'http://{}:{}'.format(*self.server_address[:2])
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def start(self) -> 'MeteocatStubServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def day_lightnings(self, query: Dict[str, str], year: str, month: str, day: str) -> Union[List[Dict[str, Any]], None]:
+        return self.data.day_lightnings(datetime.date(int(year), int(month), int(day)))
+
+    def grouped_lightnings(self, query: Dict[str, str], year: str, month: str, day: str) -> Union[List[Dict[str, Any]], None]:
+        # First lightning of each flash
+        return self.data.grouped_lightnings(datetime.date(int(year), int(month), int(day)))
+
+    def lightning(self, query: Dict[str, str], identifier: str) -> Union[Dict[str, Any], None]:
+        return self.data.lightning(int(identifier))
+
+    def nearest_station(self, query: Dict[str, str]) -> Union[Dict[str, Any], None]:
+        if 'x' not in query or 'y' not in query:
+            return None
+        return self.data.nearest_station(float(query['x']), float(query['y']))
+
+    def measure(self, query: Dict[str, str], station: str, variable: str) -> Union[Any, None]:
+        if 'from' in query and 'to' in query:
+            return self.data.measures(station, variable, _parse_date(query['from']), _parse_date(query['to']))
+        if 'date' not in query:
+            return None
+        return self.data.measure(station, variable, query['date'], query.get('operation'))
+
+    def land_cover(self, query: Dict[str, str], identifier: str) -> Union[Dict[str, Any], None]:
+        return self.data.land_cover(int(identifier))
+
+    def discharge_count(self, query: Dict[str, str], identifier: str) -> Union[Dict[str, Any], None]:
+        return self.data.discharge_count(int(identifier))
+
+    def land_covers(self, query: Dict[str, str]) -> Union[Dict[str, Any], None]:
+        return self._batch(query, self.data.land_cover)
+
+    def discharge_counts(self, query: Dict[str, str]) -> Union[Dict[str, Any], None]:
+        return self._batch(query, self.data.discharge_count)
+
+    @staticmethod
+    def _batch(query: Dict[str, str], answer: Callable[[int], Union[Dict[str, Any], None]]) -> Union[Dict[str, Any], None]:
+        if 'ids' not in query:
+            return None
+        answers: Dict[str, Any] = dict()
+        for identifier in query['ids'].split(','):
+            value: Union[Dict[str, Any], None] = answer(int(identifier))
+            if value is not None:
+                answers[identifier] = value
+        return answers
+
+
+def _parse_date(text: str) -> datetime.datetime:
+    return datetime.datetime.strptime(text[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+def add_arguments(parser) -> None:
+    parser.add_argument('-l', '--latency', help='Seconds added to every response', default=0.0, type=float)
+    parser.add_argument('-n', '--lightnings-per-day', help='Lightnings generated every day', default=300, type=int)
+    parser.add_argument('-s', '--stations', help='Weather stations generated', default=40, type=int)
+    parser.add_argument('--seed', help='Seed of the generated data', default=1, type=int)
+
+
+def data_from_arguments(args) -> StubData:
+    return StubData(args.lightnings_per_day, args.stations, args.seed)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--port', help='Port to listen on', default=8080, type=int)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    stub: MeteocatStubServer = MeteocatStubServer(args.port, args.latency, data_from_arguments(args))
+    print('Serving on', stub.host)
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        stub.server_close()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Iterable
+from typing import Iterator
+from typing import Union
+
+
+def evaluate_in_order(evaluate: Callable[..., Any], items: Iterable[Any], executor: Union[Executor, None] = None, ahead: int = 1) -> Iterator[Any]:
+    """
+    Results of evaluate(*item) for the items in their order. With an executor up to `ahead` items are evaluated at the
+    same time, before the caller asks for them, so the caller sees the same sequence as a serial loop and can stop at
+    any point. The evaluations that were started and not consumed are cancelled or discarded when the generator is
+    closed.
+    """
+    if executor is None or ahead <= 1:
+        for item in items:
+            yield evaluate(*item)
+        return
+    pending: Deque[Future] = collections.deque()
+    iterator: Iterator[Any] = iter(items)
+    try:
+        while True:
+            while len(pending) < ahead:
+                item: Union[Any, None] = next(iterator, None)
+                if item is None:
+                    break
+                pending.append(executor.submit(evaluate, *item))
+            if len(pending) == 0:
+                return
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import threading
+import time
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+# Access times of the hits are written together every this many hits, with the next put and on close
+ACCESS_BATCH: int = 100
+
+
+class ResponseCache(object):
+    """
+    Persistent cache of API response bodies stored in a SQLite file. Entries are keyed by endpoint path and query, can
+    expire with a per endpoint time to live (None means never) and the least recently used entries are evicted when the
+    stored bodies exceed max_bytes. Hits only read the file, their access times are kept in memory and written in
+    batches, so cached reads of several processes do not wait for each other on the database lock.
+    """
+    def __init__(self, filename: str, max_bytes: int, ttls: Union[Dict[str, Union[float, None]], None] = None,
+                 default_ttl: Union[float, None] = None):
+        self.filename: str = filename
+        self.max_bytes: int = max_bytes
+        self.ttls: Dict[str, Union[float, None]] = dict() if ttls is None else dict(ttls)
+        self.default_ttl: Union[float, None] = default_ttl
+        self.hits: Dict[str, int] = dict()
+        self.misses: Dict[str, int] = dict()
+        self.evictions: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._accessed: Dict[str, float] = dict()
+        # The file can be shared between several scripts or processes running at the same time
+        self._connection: sqlite3.Connection = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, "
+                                 "body BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, "
+                                 "accessed REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._size: int = self._stored_size()
+        # The file may have been filled with a larger limit
+        self._evict()
+        self._connection.commit()
+
+    def _stored_size(self) -> int:
+        return int(self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0])
+
+    def get(self, endpoint: str, key: str) -> Union[bytes, None]:
+        now: float = time.time()
+        with self._lock:
+            row: Union[Tuple[bytes, float], None] = self._connection.execute(
+                "SELECT body, created FROM responses WHERE key = ?", (key, )).fetchone()
+            ttl: Union[float, None] = self.ttls.get(endpoint, self.default_ttl)
+            if row is None or (ttl is not None and now - row[1] > ttl):
+                self.misses[endpoint] = self.misses.get(endpoint, 0) + 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_BATCH:
+                self._write_accessed()
+                self._connection.commit()
+            self.hits[endpoint] = self.hits.get(endpoint, 0) + 1
+            return bytes(row[0])
+
+    def _write_accessed(self) -> None:
+        self._connection.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                     [(accessed, key) for key, accessed in self._accessed.items()])
+        self._accessed.clear()
+
+    def put(self, endpoint: str, key: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        now: float = time.time()
+        with self._lock:
+            # Pending access times are written first, so the eviction order is up to date
+            self._accessed.pop(key, None)
+            self._write_accessed()
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key, )).fetchone()
+            self._connection.execute("INSERT OR REPLACE INTO responses (key, endpoint, body, size, created, accessed) "
+                                     "VALUES (?, ?, ?, ?, ?, ?)", (key, endpoint, sqlite3.Binary(body), len(body), now,
+                                                                   now))
+            self._size += len(body) - (0 if previous is None else int(previous[0]))
+            if self._size > self.max_bytes:
+                # Other processes may have written to the same file, so the real size is read before evicting
+                self._size = self._stored_size()
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes:
+            rows: List[Tuple[str, int]] = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 100").fetchall()
+            if len(rows) == 0:
+                self._size = 0
+                break
+            for key, size in rows:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key, ))
+                self._size -= size
+                self.evictions += 1
+                if self._size <= self.max_bytes:
+                    break
+
+    def statistics(self) -> Dict[str, Tuple[int, int]]:
+        endpoints: List[str] = sorted(set(self.hits.keys()) | set(self.misses.keys()))
+        return {endpoint: (self.hits.get(endpoint, 0), self.misses.get(endpoint, 0)) for endpoint in endpoints}
+
+    def print_statistics(self) -> None:
+        for endpoint, (hits, misses) in self.statistics().items():
+            print('Cache {}: {} hits, {} misses'.format(endpoint, hits, misses))
+        print('Cache size: {} bytes, {} evictions'.format(self._size, self.evictions))
+
+    def close(self) -> None:
+        with self._lock:
+            if len(self._accessed) > 0:
+                self._write_accessed()
+                self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import contextlib
+import json
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Union
+
+# Upper bounds in milliseconds of the latency histogram buckets, the last bucket has no bound
+LATENCY_BUCKETS: List[float] = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_lock: threading.Lock = threading.Lock()
+_start: float = time.perf_counter()
+_endpoints: Dict[str, Dict[str, Any]] = dict()
+_stages: Dict[str, Dict[str, float]] = dict()
+_records: List[float] = list()
+_last_record: Union[float, None] = None
+
+
+def _new_endpoint() -> Dict[str, Any]:
+    return {'requests': 0, 'cache_hits': 0, 'errors': 0, 'not_found': 0, 'bytes': 0, 'seconds': 0.0,
+            'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1)}
+
+
+def record_request(endpoint: str, seconds: float, status_code: int, size: int, cached: bool = False) -> None:
+    # Requests that raised an exception are recorded with status code 0
+    with _lock:
+        metrics: Dict[str, Any] = _endpoints.setdefault(endpoint, _new_endpoint())
+        metrics['requests'] += 1
+        metrics['bytes'] += size
+        if cached:
+            metrics['cache_hits'] += 1
+            return
+        metrics['seconds'] += seconds
+        metrics['latency_histogram'][bisect.bisect_left(LATENCY_BUCKETS, seconds * 1000)] += 1
+        if status_code == 404:
+            metrics['not_found'] += 1
+        elif status_code != 200:
+            metrics['errors'] += 1
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    # Wall time spent in a stage of the script, stages run by several threads at once add their times
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed: float = time.perf_counter() - start
+        with _lock:
+            metrics: Dict[str, float] = _stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            metrics['calls'] += 1
+            metrics['seconds'] += elapsed
+
+
+def start_records() -> None:
+    global _last_record
+    with _lock:
+        _last_record = time.perf_counter()
+
+
+def record() -> None:
+    # Marks the end of an input record, its latency is the time since the previous mark or start_records()
+    global _last_record
+    with _lock:
+        now: float = time.perf_counter()
+        if _last_record is not None:
+            _records.append(now - _last_record)
+        _last_record = now
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {'elapsed': time.perf_counter() - _start, 'latency_buckets_ms': LATENCY_BUCKETS,
+                'endpoints': json.loads(json.dumps(_endpoints)), 'stages': json.loads(json.dumps(_stages)),
+                'record_seconds': list(_records)}
+
+
+def merge(metrics: Dict[str, Any]) -> None:
+    # Adds the metrics of another process, e.g. a worker
+    with _lock:
+        for endpoint, values in metrics['endpoints'].items():
+            merged: Dict[str, Any] = _endpoints.setdefault(endpoint, _new_endpoint())
+            for name, value in values.items():
+                if name == 'latency_histogram':
+                    merged[name] = [a + b for a, b in zip(merged[name], value)]
+                else:
+                    merged[name] += value
+        for name, values in metrics['stages'].items():
+            merged_stage: Dict[str, float] = _stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            merged_stage['calls'] += values['calls']
+            merged_stage['seconds'] += values['seconds']
+        _records.extend(metrics['record_seconds'])
+
+
+def percentile(histogram: List[int], fraction: float) -> Union[float, None]:
+    # Upper bound in milliseconds of the bucket holding the percentile, None for the unbounded bucket
+    total: int = sum(histogram)
+    if total == 0:
+        return 0.0
+    accumulated: int = 0
+    for bound, count in zip(LATENCY_BUCKETS + [None], histogram):
+        accumulated += count
+        if accumulated >= fraction * total:
+            return bound
+    return None
+
+
+def record_percentile(seconds: List[float], fraction: float) -> float:
+    if len(seconds) == 0:
+        return 0.0
+    return sorted(seconds)[min(len(seconds) - 1, int(fraction * len(seconds)))]
+
+
+def print_summary(metrics: Dict[str, Any]) -> None:
+    print('Run time: {:.1f} s'.format(metrics['elapsed']))
+    records: List[float] = metrics['record_seconds']
+    if len(records) > 0:
+        print('Records: {}, {:.2f} records/s, p50 {:.1f} ms, p99 {:.1f} ms'.format(
+            len(records), len(records) / max(metrics['elapsed'], 1e-9), 1000 * record_percentile(records, 0.5),
+            1000 * record_percentile(records, 0.99)))
+    for endpoint, values in sorted(metrics['endpoints'].items()):
+        asked: int = values['requests'] - values['cache_hits']
+        print('Endpoint {}: {} requests, {:.1%} cache hits, {:.1%} not found, {:.1%} errors, {:.1f} MB, '
+              '{:.1f} ms mean, p50 <= {} ms, p99 <= {} ms'.format(
+                  endpoint, values['requests'], values['cache_hits'] / max(values['requests'], 1),
+                  values['not_found'] / max(asked, 1), values['errors'] / max(asked, 1), values['bytes'] / 1048576,
+                  1000 * values['seconds'] / max(asked, 1), percentile(values['latency_histogram'], 0.5),
+                  percentile(values['latency_histogram'], 0.99)))
+    for name, values in metrics['stages'].items():
+        print('Stage {}: {:.1f} s in {} calls'.format(name, values['seconds'], values['calls']))
+
+
+def add_arguments(parser) -> None:
+    parser.add_argument('--metrics-file', help='JSON file where the request and stage metrics of the run are written',
+                        default=None)
+
+
+def report(filename: Union[str, None] = None) -> None:
+    metrics: Dict[str, Any] = snapshot()
+    print_summary(metrics)
+    if filename is not None:
+        with open(filename, 'w') as file:
+            json.dump(metrics, file, indent=2)
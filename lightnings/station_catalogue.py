@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import csv
+import datetime
+import dateutil.parser
+import json
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+import requests
+from scipy.spatial import cKDTree
+
+import meteocat_client
+from lightning_columns import parse_epochs
+from lightning_columns import to_epoch
+
+OPEN_END: int = np.iinfo(np.int64).max
+
+
+class StationCatalogue(object):
+    """
+    Local copy of the weather station network. Each station has the period in which it was operative and the catalogue
+    the date it was exported: lookups after that date are stale and must be asked to the API. The validity limits split
+    the time in periods with the same operative stations, and a KD-tree is built for each period on demand.
+
+    The catalogue file is a JSON object: {"updated": "<ISO date>", "stations": [{"code": ..., "coordinates_x": ...,
+    "coordinates_y": ..., "valid_from": "<ISO date>", "valid_to": "<ISO date or null>"}, ...]}
+    """
+    def __init__(self, codes: List[str], x: np.ndarray, y: np.ndarray, valid_from: np.ndarray, valid_to: np.ndarray,
+                 updated: int):
+        self.codes: np.ndarray = np.array(codes, dtype=object)
+        self.points: np.ndarray = np.column_stack([x, y]).astype(np.float64)
+        self.valid_from: np.ndarray = valid_from
+        self.valid_to: np.ndarray = valid_to
+        self.updated: int = updated
+        self.limits: np.ndarray = np.unique(np.concatenate([valid_from, valid_to[valid_to != OPEN_END]]))
+        self._trees: Dict[int, Tuple[Union[cKDTree, None], np.ndarray]] = dict()
+
+    @classmethod
+    def load(cls, filename: str) -> 'StationCatalogue':
+        with open(filename) as file:
+            catalogue: Dict[str, Any] = json.load(file)
+        stations: List[Dict[str, Any]] = catalogue['stations']
+        valid_to: np.ndarray = np.full(len(stations), OPEN_END, dtype=np.int64)
+        closed: List[int] = [i for i, station in enumerate(stations) if station.get('valid_to') is not None]
+        valid_to[closed] = parse_epochs([stations[i]['valid_to'] for i in closed])
+        return cls([str(station['code']) for station in stations],
+                   np.array([station['coordinates_x'] for station in stations], dtype=np.float64),
+                   np.array([station['coordinates_y'] for station in stations], dtype=np.float64),
+                   parse_epochs([station['valid_from'] for station in stations]), valid_to,
+                   to_epoch(dateutil.parser.isoparse(catalogue['updated'])))
+
+    def _tree(self, period: int, epoch: int) -> Tuple[Union[cKDTree, None], np.ndarray]:
+        if period not in self._trees:
+            operative: np.ndarray = np.nonzero((self.valid_from <= epoch) & (epoch < self.valid_to))[0]
+            tree: Union[cKDTree, None] = cKDTree(self.points[operative]) if len(operative) > 0 else None
+            self._trees[period] = (tree, operative)
+        return self._trees[period]
+
+    def nearest(self, epoch: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # Codes of the nearest operative station of each point, None where the catalogue can not answer
+        epoch = np.asarray(epoch, dtype=np.int64)
+        points: np.ndarray = np.column_stack([x, y]).astype(np.float64)
+        codes: np.ndarray = np.full(len(epoch), None, dtype=object)
+        periods: np.ndarray = np.searchsorted(self.limits, epoch, side='right')
+        answerable: np.ndarray = epoch <= self.updated
+        for period in np.unique(periods[answerable]):
+            selected: np.ndarray = np.nonzero(answerable & (periods == period))[0]
+            tree, operative = self._tree(int(period), int(epoch[selected[0]]))
+            if tree is None:
+                continue
+            _, nearest = tree.query(points[selected])
+            codes[selected] = self.codes[operative[nearest]]
+        return codes
+
+    def nearest_code(self, date: datetime.datetime, x: float, y: float) -> Union[str, None]:
+        return self.nearest(np.array([to_epoch(date)]), np.array([x]), np.array([y]))[0]
+
+
+def get_nearest_weather_station_code(date: datetime.datetime, x: float, y: float, host: str, username: str, token: str) -> Union[str, None]:
+    url: str = "{}/meteocat/station/nearest?date={}&x={}&y={}&srid=25831".format(host,
+                                                                                 date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                                                                                 str(x), str(y))
+    response: requests.Response = meteocat_client.get(url, username, token)
+    if response.status_code == 200:
+        return json.loads(response.text)['code']
+    else:
+        return None
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Records the API answer for a sample of points, or checks the catalogue against a recorded sample
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--mode', help='record: ask the API for the sample points, verify: compare the catalogue '
+                                             'with a recorded sample', default='verify')
+    parser.add_argument('-s', '--stations-file', help='Weather stations catalogue file')
+    parser.add_argument('-i', '--input-file', help='Sample file with DATE, X, Y columns (and CODE once recorded)')
+    parser.add_argument('-o', '--output-file', help='Recorded sample file')
+    parser.add_argument('-H', '--host', help='Host name were the database cluster is located')
+    parser.add_argument('-u', '--username', help='Database username')
+    parser.add_argument('-t', '--token', help='Database password')
+    meteocat_client.add_arguments(parser)
+    args = parser.parse_args()
+    meteocat_client.configure_from_arguments(args)
+
+    with open(args.input_file) as csvfile:
+        sample: List[Dict[str, str]] = list(csv.DictReader(csvfile))
+    if args.mode == 'record':
+        with open(args.output_file, 'w') as file:
+            writer = csv.writer(file)
+            writer.writerow(['DATE', 'X', 'Y', 'CODE'])
+            for point in sample:
+                code = get_nearest_weather_station_code(dateutil.parser.isoparse(point['DATE']), float(point['X']),
+                                                        float(point['Y']), args.host, args.username, args.token)
+                writer.writerow([point['DATE'], point['X'], point['Y'], code])
+    else:
+        stations: StationCatalogue = StationCatalogue.load(args.stations_file)
+        found = stations.nearest(parse_epochs([point['DATE'] for point in sample]),
+                                 np.array([float(point['X']) for point in sample]),
+                                 np.array([float(point['Y']) for point in sample]))
+        matches: int = 0
+        stale: int = 0
+        for point, code in zip(sample, found):
+            if code is None:
+                stale += 1
+            elif code == point['CODE']:
+                matches += 1
+            else:
+                print('Mismatch', point['DATE'], point['X'], point['Y'], 'API:', point['CODE'], 'catalogue:', code)
+        print('{} points, {} match, {} mismatch, {} not in the catalogue'.format(len(sample), matches,
+                                                                                  len(sample) - matches - stale, stale))
+    meteocat_client.close()
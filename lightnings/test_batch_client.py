@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Union
+
+import pytest
+
+from batch_client import BatchLookup
+from batch_client import MAXIMUM_BATCH_SIZE
+from batch_client import download_land_covers
+from discharge_table import download_counts
+from meteocat_stub_server import DAY_IDENTIFIERS
+from meteocat_stub_server import MeteocatStubServer
+
+# Lightnings of three days of the stub server
+IDENTIFIERS: List[int] = [day * DAY_IDENTIFIERS + k for day in (736116, 736117, 736118) for k in range(100)]
+FAILING: int = IDENTIFIERS[150]
+
+
+@pytest.fixture
+def stub() -> MeteocatStubServer:
+    server: MeteocatStubServer = MeteocatStubServer().start()
+    yield server
+    server.stop()
+
+
+def fail_batches_with(stub: MeteocatStubServer, route: str, identifier: int) -> None:
+    # The batches holding the identifier are not answered, as in a server error
+    for k, (pattern, answer) in enumerate(stub.routes):
+        if answer.__name__ == route:
+            def failing(query: Dict[str, str], answer=answer) -> Union[Dict[str, Any], None]:
+                return None if str(identifier) in query.get('ids', '').split(',') else answer(query)
+            failing.__name__ = route
+            stub.routes[k] = (pattern, failing)
+
+
+def test_batches_not_answered_are_missing(stub: MeteocatStubServer) -> None:
+    fail_batches_with(stub, 'land_covers', FAILING)
+    answers: Union[Dict[int, Dict[str, Any]], None] = download_land_covers(IDENTIFIERS, stub.host, 'user', 'token', 50)
+    assert sorted(answers) == IDENTIFIERS[:150] + IDENTIFIERS[200:]
+    assert all(answers[identifier] == stub.data.land_cover(identifier) for identifier in answers)
+
+
+def test_server_without_batch_route(stub: MeteocatStubServer) -> None:
+    stub.routes = [(pattern, answer) for pattern, answer in stub.routes if answer.__name__ != 'land_covers']
+    assert download_land_covers(IDENTIFIERS, stub.host, 'user', 'token') is None
+    assert download_land_covers([], stub.host, 'user', 'token') == dict()
+
+
+def test_batch_size_is_clamped(stub: MeteocatStubServer) -> None:
+    answers: Union[Dict[int, Dict[str, Any]], None] = download_land_covers(IDENTIFIERS, stub.host, 'user', 'token',
+                                                                           10 * MAXIMUM_BATCH_SIZE)
+    assert len(answers) == len(IDENTIFIERS)
+    assert stub.requests['land_covers'] == len(IDENTIFIERS) // MAXIMUM_BATCH_SIZE
+    assert BatchLookup(lambda identifiers: None, IDENTIFIERS, 1000).batch_size == MAXIMUM_BATCH_SIZE
+
+
+def test_lookup_keeps_the_batches_after_one_not_answered(stub: MeteocatStubServer) -> None:
+    fail_batches_with(stub, 'land_covers', FAILING)
+    lookup: BatchLookup = BatchLookup(lambda identifiers: download_land_covers(identifiers, stub.host, 'user',
+                                                                               'token'), IDENTIFIERS, 100)
+    for position, identifier in enumerate(IDENTIFIERS):
+        expected: Union[Dict[str, Any], None] = None if 100 <= position < 200 else stub.data.land_cover(identifier)
+        assert lookup.get(position) == expected
+    assert lookup.available
+    assert stub.requests['land_covers'] == 3
+
+
+def test_lookup_without_batch_route() -> None:
+    asked: List[List[int]] = list()
+
+    def download(identifiers: List[int]) -> Union[Dict[int, Dict[str, Any]], None]:
+        asked.append(identifiers)
+        return None
+
+    lookup: BatchLookup = BatchLookup(download, IDENTIFIERS, 100)
+    assert all(lookup.get(position) is None for position in range(len(IDENTIFIERS)))
+    assert not lookup.available
+    assert len(asked) == 1
+
+
+def test_counts_not_answered_in_batch_are_asked_one_by_one(stub: MeteocatStubServer) -> None:
+    fail_batches_with(stub, 'discharge_counts', FAILING)
+    answers: Dict[int, Dict[str, Any]] = download_counts(IDENTIFIERS, stub.host, 'user', 'token')
+    assert answers == {identifier: stub.data.discharge_count(identifier) for identifier in IDENTIFIERS}
+    assert stub.requests['discharge_count'] == 100
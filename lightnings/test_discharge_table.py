@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import pytest
+
+from discharge_table import DischargeDays
+from discharge_table import DischargeTable
+from lightning_columns import LightningColumns
+from meteocat_stub_server import MeteocatStubServer
+from meteocat_stub_server import StubData
+
+FIRST_DAY: datetime.date = datetime.date(2016, 6, 1)
+
+
+def columns(lightnings: List[Tuple[int, str, float]]) -> LightningColumns:
+    return LightningColumns.from_lightnings([{'id': identifier, 'meteocat_id': identifier, 'date': date,
+                                              'coordinates_x': x, 'coordinates_y': 4630000.0}
+                                             for identifier, date, x in lightnings])
+
+
+# Not sorted by date: a flash of 3 discharges, a single one, a flash of 2 crossing midnight, a discharge close in time
+# but far from the previous one, and a flash with two grouped lightnings
+INDIVIDUAL: List[Tuple[int, str, float]] = [
+    (5, '2016-06-01T23:59:59.900000Z', 430000.0), (1, '2016-06-01T10:00:00.000000Z', 430000.0),
+    (2, '2016-06-01T10:00:00.200000Z', 431000.0), (3, '2016-06-01T10:00:00.600000Z', 431500.0),
+    (4, '2016-06-01T12:00:00.000000Z', 430000.0), (6, '2016-06-02T00:00:00.100000Z', 430500.0),
+    (7, '2016-06-02T00:00:00.200000Z', 460000.0), (8, '2016-06-02T05:00:00.000000Z', 430000.0),
+    (9, '2016-06-02T05:00:00.100000Z', 430000.0)]
+GROUPED: List[Tuple[int, str, float]] = [(1, '2016-06-01T10:00:00.000000Z', 430000.0),
+                                         (4, '2016-06-01T12:00:00.000000Z', 430000.0),
+                                         (5, '2016-06-01T23:59:59.900000Z', 430000.0),
+                                         (7, '2016-06-02T00:00:00.200000Z', 460000.0),
+                                         (8, '2016-06-02T05:00:00.000000Z', 430000.0),
+                                         (9, '2016-06-02T05:00:00.100000Z', 430000.0)]
+COUNTS: Dict[int, int] = {1: 3, 2: 3, 3: 3, 4: 1, 5: 2, 6: 2, 7: 1}
+
+
+def test_from_columns_counts_the_flashes_with_one_grouped_lightning() -> None:
+    table: DischargeTable = DischargeTable.from_columns(columns(INDIVIDUAL), columns(GROUPED))
+    for identifier in range(1, 11):
+        assert table.get(identifier) == ({'count': COUNTS[identifier]} if identifier in COUNTS else None)
+
+
+def test_from_columns_without_grouped_lightnings_is_empty() -> None:
+    assert len(DischargeTable.from_columns(columns(INDIVIDUAL), columns([]))) == 0
+    assert len(DischargeTable.from_columns(columns([]), columns(GROUPED))) == 0
+
+
+def test_from_days_joins_the_flashes_crossing_midnight() -> None:
+    days: List[Tuple[datetime.date, Tuple[LightningColumns, LightningColumns]]] = [
+        (FIRST_DAY + datetime.timedelta(days=1), (columns(INDIVIDUAL[5:]), columns(GROUPED[3:]))),
+        (FIRST_DAY, (columns(INDIVIDUAL[:5]), columns(GROUPED[:3])))]
+    table: DischargeTable = DischargeTable.from_days(days)
+    assert table.get(5) == {'count': 2} and table.get(6) == {'count': 2}
+
+
+def test_check_keeps_the_table_when_the_api_agrees() -> None:
+    table: DischargeTable = DischargeTable.from_columns(columns(INDIVIDUAL), columns(GROUPED))
+    asked: List[List[int]] = list()
+
+    def download(identifiers: List[int]) -> Dict[int, Dict[str, Any]]:
+        asked.append(identifiers)
+        return {identifier: {'count': COUNTS[identifier]} for identifier in identifiers}
+
+    assert table.check(download, 3)
+    assert len(asked) == 1 and len(asked[0]) == 3
+    assert len(table) == len(COUNTS)
+
+
+@pytest.mark.parametrize('answers', [{'count': 5}, None])
+def test_check_empties_the_table_when_the_api_differs(answers: Any) -> None:
+    table: DischargeTable = DischargeTable.from_columns(columns(INDIVIDUAL), columns(GROUPED))
+    assert not table.check(lambda identifiers: {identifier: answers for identifier in identifiers
+                                                if answers is not None}, 3)
+    assert len(table) == 0
+    assert table.get(1) is None
+
+
+def test_stub_flashes_follow_the_grouping_rule() -> None:
+    data: StubData = StubData(lightnings_per_day=1000)
+    days: List[datetime.date] = [FIRST_DAY + datetime.timedelta(days=k) for k in range(3)]
+    table: DischargeTable = DischargeTable.from_days(
+        [(day, (LightningColumns.from_lightnings(data.day_lightnings(day)),
+                LightningColumns.from_lightnings(data.grouped_lightnings(day)))) for day in days])
+    identifiers: List[int] = [lightning['id'] for day in days for lightning in data.day_lightnings(day)]
+    assert len(table) == len(identifiers)
+    assert all(table.get(identifier) == data.discharge_count(identifier) for identifier in identifiers)
+    assert max(table.counts) > 1
+
+
+@pytest.fixture
+def stub() -> MeteocatStubServer:
+    server: MeteocatStubServer = MeteocatStubServer(data=StubData(lightnings_per_day=200)).start()
+    yield server
+    server.stop()
+
+
+def test_discharge_days_check_the_api_once(stub: MeteocatStubServer) -> None:
+    days: DischargeDays = DischargeDays(stub.host, 'user', 'token')
+    for k in range(4):
+        day: datetime.date = FIRST_DAY + datetime.timedelta(days=k)
+        day_columns, table = days.get(day)
+        assert len(day_columns) == 200
+        assert all(table.get(int(identifier)) == stub.data.discharge_count(int(identifier))
+                   for identifier in day_columns.ids)
+    assert stub.requests['discharge_counts'] == 1
+    assert 'discharge_count' not in stub.requests
+
+
+def test_discharge_days_stop_when_the_api_differs(stub: MeteocatStubServer) -> None:
+    stub.data.discharge_count = lambda identifier: {'count': 99}
+    days: DischargeDays = DischargeDays(stub.host, 'user', 'token')
+    day_columns, table = days.get(FIRST_DAY)
+    assert len(day_columns) == 200 and table is None
+    grouped_days: int = stub.requests['grouped_lightnings']
+    for k in range(1, 4):
+        day_columns, table = days.get(FIRST_DAY + datetime.timedelta(days=k))
+        assert len(day_columns) == 200 and table is None
+    # Only the individual lists are downloaded after the check
+    assert stub.requests['grouped_lightnings'] == grouped_days
+    assert stub.requests['discharge_counts'] == 1
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from typing import List
+from typing import Union
+
+import pytest
+
+from example_output import ExampleWriter
+
+HEADER: List[str] = ['ID', 'VALUE']
+# Matched inputs repeat a lightning when it matches several fires, the fourth one has no output row
+INPUTS: List[str] = ['10', '11', '10', '12', '13', '11', '11', '14']
+
+
+def rows_of(key: str) -> List[List[str]]:
+    return [] if key == '12' else [[key, 'value of ' + key]]
+
+
+def run(filename: str, resume: bool = False, stop: Union[int, None] = None, key_column: Union[int, None] = 0) -> None:
+    # Inputs processed as the fill scripts do, the run is interrupted before the input at position stop
+    writer: ExampleWriter = ExampleWriter(filename, HEADER, resume, key_column)
+    for position, key in enumerate(INPUTS):
+        if position == stop:
+            # Rows of an unfinished input reach the file without checkpoint
+            writer._writer.writerows(rows_of(key))
+            writer._file.flush()
+            break
+        if writer.skip(position, key if key_column is not None else None):
+            continue
+        writer.commit(rows_of(key), position)
+    writer.close()
+
+
+def read(filename: str) -> str:
+    with open(filename) as file:
+        return file.read()
+
+
+@pytest.fixture
+def expected(tmp_path) -> str:
+    filename: str = str(tmp_path / 'expected.csv')
+    run(filename)
+    return read(filename)
+
+
+@pytest.mark.parametrize('stop', [1, 2, 3, 5, 6, 7])
+def test_resume_from_checkpoint_with_repeated_keys(tmp_path, expected: str, stop: int) -> None:
+    filename: str = str(tmp_path / 'output.csv')
+    run(filename, stop=stop, key_column=None)
+    run(filename, resume=True, key_column=None)
+    assert read(filename) == expected
+
+
+@pytest.mark.parametrize('stop', [1, 2, 3, 5, 6, 7])
+def test_resume_without_checkpoint_with_repeated_keys(tmp_path, expected: str, stop: int) -> None:
+    filename: str = str(tmp_path / 'output.csv')
+    run(filename, stop=stop)
+    # The unfinished input rows are complete here, so the output only misses the inputs after it
+    os.remove(filename + '.checkpoint')
+    run(filename, resume=True)
+    assert read(filename) == expected
+
+
+def test_resume_counts_rows(tmp_path) -> None:
+    filename: str = str(tmp_path / 'output.csv')
+    run(filename, stop=6)
+    writer: ExampleWriter = ExampleWriter(filename, HEADER, True)
+    assert writer.rows == 5
+    writer.close()
+    # The checkpoint truncated the unfinished input, the 5 rows only have 3 distinct keys
+    os.remove(filename + '.checkpoint')
+    writer = ExampleWriter(filename, HEADER, True)
+    assert writer.rows == 5
+    writer.close()
+
+
+def test_resume_without_checkpoint_needs_a_key_column(tmp_path) -> None:
+    filename: str = str(tmp_path / 'output.csv')
+    run(filename, stop=3)
+    os.remove(filename + '.checkpoint')
+    with pytest.raises(ValueError):
+        ExampleWriter(filename, HEADER, True, key_column=None)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import math
+import random
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import dateutil.parser
+import numpy as np
+import pytest
+
+from lightning_columns import LightningColumns
+from lightning_columns import to_epoch
+from lightning_index import LightningIndex
+
+MAXIMUM_COST: float = 15000
+FIRST_DATE: datetime.datetime = datetime.datetime(2016, 6, 1, tzinfo=datetime.timezone.utc)
+
+
+def synthetic_lightnings(count: int, seed: int) -> List[Dict[str, Any]]:
+    # Lightnings over two days in a 60 km square, not sorted by time, some of them repeated to have ties in the cost
+    generator: random.Random = random.Random(seed)
+    lightnings: List[Dict[str, Any]] = list()
+    for k in range(count):
+        date: datetime.datetime = FIRST_DATE + datetime.timedelta(seconds=generator.uniform(0, 2 * 86400))
+        lightnings.append({'id': k, 'meteocat_id': k, 'date': date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                           'coordinates_x': generator.uniform(400000, 460000),
+                           'coordinates_y': generator.uniform(4600000, 4660000)})
+        if generator.random() < 0.1:
+            lightnings.append(dict(lightnings[-1], id=count + k))
+    return lightnings
+
+
+def brute_force(lightnings: List[Dict[str, Any]], x: float, y: float, date: datetime.datetime,
+                time_divider: float) -> List[Tuple[float, int]]:
+    # Search of match_lightnings.py before the index, every lightning of the window is evaluated
+    computed_cost_lightnings = list()
+    for possible in lightnings:
+        possible_date = dateutil.parser.isoparse(possible['date'])
+        diff_time: datetime.timedelta = date - possible_date
+        if diff_time.total_seconds() > 0:
+            distance = math.sqrt((x - possible['coordinates_x']) ** 2 + (y - possible['coordinates_y']) ** 2 +
+                                 (diff_time.total_seconds() / time_divider) ** 2)
+            if distance < MAXIMUM_COST:
+                computed_cost_lightnings.append([distance, possible['id']])
+    computed_cost_lightnings.sort(key=lambda l: l[0])
+    return [(cost, identifier) for cost, identifier in computed_cost_lightnings]
+
+
+def records(lightnings: List[Dict[str, Any]], seed: int) -> List[Tuple[float, float, datetime.datetime]]:
+    generator: random.Random = random.Random(seed)
+    result: List[Tuple[float, float, datetime.datetime]] = list()
+    for _ in range(50):
+        lightning: Dict[str, Any] = generator.choice(lightnings)
+        date: datetime.datetime = dateutil.parser.isoparse(lightning['date'])
+        # Near a lightning some minutes after it
+        result.append((lightning['coordinates_x'] + generator.uniform(-2000, 2000),
+                       lightning['coordinates_y'] + generator.uniform(-2000, 2000),
+                       date + datetime.timedelta(seconds=generator.uniform(60, 3 * 3600))))
+    # At the same time of a lightning, that is not a candidate because it does not precede the record
+    lightning = lightnings[0]
+    result.append((lightning['coordinates_x'], lightning['coordinates_y'], dateutil.parser.isoparse(lightning['date'])))
+    # Before the first lightning and after the last one, near and far in time
+    result.append((430000, 4630000, FIRST_DATE - datetime.timedelta(hours=1)))
+    result.append((430000, 4630000, FIRST_DATE + datetime.timedelta(days=2, minutes=10)))
+    result.append((430000, 4630000, FIRST_DATE + datetime.timedelta(days=20)))
+    return result
+
+
+@pytest.mark.parametrize('time_divider', [1, 60])
+def test_query_returns_the_brute_force_candidates(time_divider: float) -> None:
+    lightnings: List[Dict[str, Any]] = synthetic_lightnings(2000, 1234)
+    index: LightningIndex = LightningIndex.from_columns(LightningColumns.from_lightnings(lightnings))
+    found: int = 0
+    for x, y, date in records(lightnings, 5678):
+        expected: List[Tuple[float, int]] = brute_force(lightnings, x, y, date, time_divider)
+        candidates, costs = index.query(x, y, to_epoch(date), time_divider, MAXIMUM_COST)
+        assert [lightnings[candidate]['id'] for candidate in candidates] == [identifier for _, identifier in expected]
+        np.testing.assert_allclose(costs, [cost for cost, _ in expected], rtol=1e-12)
+        found += len(expected)
+    # The records are near the lightnings, so the comparison is not only between empty results
+    assert found > 0
+
+
+def test_query_keeps_ties_in_input_order() -> None:
+    lightning: Dict[str, Any] = {'id': 0, 'meteocat_id': 0, 'date': '2016-06-01T12:00:00.000000Z',
+                                 'coordinates_x': 430000.0, 'coordinates_y': 4630000.0}
+    lightnings: List[Dict[str, Any]] = [dict(lightning, id=k) for k in range(5)]
+    index: LightningIndex = LightningIndex.from_columns(LightningColumns.from_lightnings(lightnings))
+    date: datetime.datetime = dateutil.parser.isoparse(lightning['date']) + datetime.timedelta(minutes=5)
+    candidates, costs = index.query(431000, 4630000, to_epoch(date), 60, MAXIMUM_COST)
+    assert list(candidates) == [0, 1, 2, 3, 4]
+    assert [k for _, k in brute_force(lightnings, 431000, 4630000, date, 60)] == [0, 1, 2, 3, 4]
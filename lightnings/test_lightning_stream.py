@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import random
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+import numpy as np
+import pytest
+
+from lightning_columns import LightningColumns
+from lightning_stream import INITIAL_ROWS
+from lightning_stream import decode_lightnings
+from meteocat_stub_server import StubData
+
+FIELDS: List[str] = ['ids', 'meteocat_ids', 'epoch', 'x', 'y', 'peak_current', 'chi_squared', 'number_of_sensors',
+                     'hit_ground']
+# Fields not stored in the columns, with multibyte characters, and lightnings without the optional values
+LIGHTNINGS: List[Dict[str, Any]] = [
+    {'id': 1, 'meteocat_id': 11, 'date': '2016-06-01T10:00:00.000000Z', 'coordinates_x': 430000.5,
+     'coordinates_y': 4630000.25, 'peak_current': -12.5, 'chi_squared': 1.25, 'number_of_sensors': 7,
+     'hit_ground': True, 'municipality': "Vilanova d’Àger — Sant Martí"},
+    {'id': 2, 'meteocat_id': 12, 'date': '2016-06-01T10:00:01.500000Z', 'coordinates_x': 431000.0,
+     'coordinates_y': 4631000.0, 'peak_current': None, 'chi_squared': None, 'hit_ground': False,
+     'comarca': 'Pallars Jussà ⚡'},
+    {'id': 3, 'meteocat_id': 13, 'date': '2016-06-01T23:59:59.999999Z', 'coordinates_x': 432000.0,
+     'coordinates_y': 4632000.0}]
+
+
+def chunked(body: bytes, sizes: List[int]) -> Iterator[bytes]:
+    # Body split in chunks of the sizes given, cycling over them
+    position: int = 0
+    k: int = 0
+    while position < len(body):
+        yield body[position:position + sizes[k % len(sizes)]]
+        position += sizes[k % len(sizes)]
+        k += 1
+
+
+def assert_same_columns(found: LightningColumns, expected: LightningColumns) -> None:
+    # Comparison of the streamed decoding of lightning_stream.py main
+    assert len(found) == len(expected)
+    for name in FIELDS:
+        assert np.array_equal(getattr(found, name), getattr(expected, name),
+                              equal_nan=name in ('peak_current', 'chi_squared')), name
+    assert np.array_equal(found.dates.values, expected.dates.values)
+
+
+def decode(chunks: Iterator[bytes]) -> LightningColumns:
+    return LightningColumns.from_records(decode_lightnings(chunks))
+
+
+@pytest.mark.parametrize('sizes', [[1], [2], [3], [7, 1, 64], [1 << 16]])
+def test_chunk_boundaries_inside_lightnings_and_characters(sizes: List[int]) -> None:
+    body: bytes = json.dumps(LIGHTNINGS, ensure_ascii=False, indent=1).encode('utf-8')
+    # The multibyte characters are split between chunks by the small sizes
+    assert len(body) > len(json.dumps(LIGHTNINGS, ensure_ascii=False, indent=1))
+    assert_same_columns(decode(chunked(body, sizes)), LightningColumns.from_lightnings(LIGHTNINGS))
+
+
+@pytest.mark.parametrize('body', [b'[]', b' \n[ \n ]\n'])
+def test_empty_list(body: bytes) -> None:
+    records: np.ndarray = decode_lightnings(chunked(body, [1]))
+    assert len(records) == 0
+    assert_same_columns(LightningColumns.from_records(records), LightningColumns.from_lightnings([]))
+
+
+def test_truncated_body() -> None:
+    body: bytes = json.dumps(LIGHTNINGS, ensure_ascii=False).encode('utf-8')
+    for end in range(len(body)):
+        with pytest.raises(ValueError):
+            decode_lightnings(chunked(body[:end], [5]))
+
+
+@pytest.mark.parametrize('body', [b'{"id": 1}', b'[]]', b'[] []', b'[{"id": 1'])
+def test_other_data_is_not_a_lightnings_list(body: bytes) -> None:
+    with pytest.raises(ValueError):
+        decode_lightnings(chunked(body, [3]))
+
+
+def test_same_columns_as_the_whole_response_decoding() -> None:
+    data: StubData = StubData(lightnings_per_day=INITIAL_ROWS + 1000)
+    body: bytes = json.dumps(data.day_lightnings(datetime.date(2016, 6, 1)) + LIGHTNINGS).encode('utf-8')
+    generator: random.Random = random.Random(1234)
+    found: LightningColumns = decode(chunked(body, [generator.randint(1, 5000) for _ in range(100)]))
+    # Decoder used before the streaming one
+    assert_same_columns(found, LightningColumns.from_lightnings(json.loads(body)))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Union
+
+import pytest
+
+from measure_store import MeasureStore
+
+ANSWERS: List[Union[Dict[str, Any], None]] = [{'value': -0.0}, {'value': 0.0}, {'value': 12}, {'value': 0.1},
+                                               {'value': -3.75}, None]
+
+
+def test_stored_answers_are_the_api_answers(tmp_path) -> None:
+    filename: str = str(tmp_path / 'measures.db')
+    store: MeasureStore = MeasureStore(filename)
+    for k, answer in enumerate(ANSWERS):
+        assert store.get(('S1', 'T', k, 0), lambda: answer) == answer
+    store.close()
+    # A new run reads the answers from the file, the API is not asked
+    store = MeasureStore(filename)
+    for k, answer in enumerate(ANSWERS[:-1]):
+        stored: Dict[str, Any] = store.get(('S1', 'T', k, 0), lambda: pytest.fail('Asked to the API'))
+        assert repr(stored) == repr(answer)
+        assert type(stored['value']) is type(answer['value'])
+    assert math.copysign(1, store.get(('S1', 'T', 0, 0), lambda: None)['value']) == -1
+    assert store.hits == len(ANSWERS)
+    store.close()
+
+
+def test_missing_measures_are_asked_again_in_a_new_run(tmp_path) -> None:
+    filename: str = str(tmp_path / 'measures.db')
+    store: MeasureStore = MeasureStore(filename)
+    assert store.get(('S1', 'T', 0, 0), lambda: None) is None
+    assert store.get(('S1', 'T', 0, 0), lambda: pytest.fail('Asked to the API')) is None
+    store.close()
+    store = MeasureStore(filename)
+    assert store.get(('S1', 'T', 0, 0), lambda: {'value': -0.0}) == {'value': -0.0}
+    assert store.fetched == 1
+    store.close()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from response_cache import ResponseCache
+
+
+def test_cache_is_trimmed_when_opened_with_a_lower_limit(tmp_path) -> None:
+    filename: str = str(tmp_path / 'cache.db')
+    cache: ResponseCache = ResponseCache(filename, 1000)
+    for k in range(10):
+        cache.put('land_cover', str(k), bytes(100))
+    # The first responses are used again, so they are the last ones to be evicted
+    for k in range(3):
+        assert cache.get('land_cover', str(k)) == bytes(100)
+    cache.close()
+    cache = ResponseCache(filename, 350)
+    assert cache._stored_size() == 300
+    assert cache.evictions == 7
+    assert [k for k in range(10) if cache.get('land_cover', str(k)) is not None] == [0, 1, 2]
+    cache.close()
+    # Opening it again with the same limit does not evict anything
+    cache = ResponseCache(filename, 350)
+    assert cache.evictions == 0
+    cache.close()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Union
+
+import numpy as np
+import requests
+
+import meteocat_client
+from measure_store import get_measure
+from lightning_columns import MICROSECONDS
+from lightning_columns import parse_epochs
+from lightning_columns import to_epoch
+
+# Operation the server applies to each variable when asked for the aggregate of the previous days
+OPERATIONS: Dict[str, str] = {'HR': 'average', 'T': 'average', 'PPT': 'sum', 'RS': 'sum', 'VV10': 'sum'}
+DAY: int = 86400 * MICROSECONDS
+
+
+class WeatherSeries(object):
+    """
+    Raw measures of a station variable. Aggregates over the previous days are computed from prefix sums, a window of N
+    days ending at a date covers the measures in (date - N days, date] and a window of 0 days is the last measure taken
+    at or before the date.
+    """
+    def __init__(self, epoch: np.ndarray, values: np.ndarray):
+        order: np.ndarray = np.argsort(epoch, kind='stable')
+        self.epoch: np.ndarray = np.asarray(epoch, dtype=np.int64)[order]
+        self.values: np.ndarray = np.asarray(values, dtype=np.float64)[order]
+        self.prefix: np.ndarray = np.concatenate([[0.0], np.cumsum(self.values)])
+
+    def aggregate(self, epoch: int, windows: List[int], operation: str) -> List[Union[float, None]]:
+        end: int = int(np.searchsorted(self.epoch, epoch, side='right'))
+        starts: np.ndarray = np.searchsorted(self.epoch, epoch - np.asarray(windows, dtype=np.int64) * DAY,
+                                             side='right')
+        counts: np.ndarray = end - starts
+        totals: np.ndarray = self.prefix[end] - self.prefix[starts]
+        if operation == 'average':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                totals = totals / counts
+        aggregates: List[Union[float, None]] = list()
+        for window, count, total in zip(windows, counts, totals):
+            if window == 0:
+                aggregates.append(float(self.values[end - 1]) if end > 0 else None)
+            else:
+                aggregates.append(float(total) if count > 0 else None)
+        return aggregates
+
+
+def download_series(date: datetime.datetime, days: int, variable: str, station_code: str, host: str, username: str, token: str) -> Union[WeatherSeries, None]:
+    start: datetime.datetime = date - datetime.timedelta(days=max(days, 1))
+    url: str = "{}/meteocat/data/measure/{}/{}?from={}&to={}".format(host, station_code, variable,
+                                                                     start.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                                                                     date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
+    response: requests.Response = meteocat_client.get(url, username, token)
+    if response.status_code == 200:
+        series: Any = json.loads(response.text)
+        if not isinstance(series, list):
+            # A server without range reads answers with the single measure at the date
+            return None
+        measures: List[Dict[str, Any]] = [measure for measure in series if measure['value'] is not None]
+        return WeatherSeries(parse_epochs([measure['date'] for measure in measures]),
+                             np.array([measure['value'] for measure in measures], dtype=np.float64))
+    else:
+        return None
+
+
+def get_aggregates(date: datetime.datetime, windows: List[int], variable: str, station_code: str, host: str, username: str, token: str) -> Union[List[Union[float, None]], None]:
+    # One range read per station and variable, None when the server can not provide the series
+    series: Union[WeatherSeries, None] = download_series(date, max(windows), variable, station_code, host, username,
+                                                         token)
+    if series is None:
+        return None
+    return series.aggregate(to_epoch(date), windows, OPERATIONS[variable])
+
+
+def get_measure_values(measure: Callable[[datetime.date, int, str, str, str, str], Union[Dict[str, Any], None]], variable: str, date: datetime.datetime, windows: List[int], station_code: str, local: bool, host: str, username: str, token: str) -> List[Union[float, None]]:
+    if local:
+        aggregates: Union[List[Union[float, None]], None] = get_aggregates(date, windows, variable, station_code, host,
+                                                                           username, token)
+        if aggregates is not None:
+            return aggregates
+    # Server side aggregation, one request per window
+    values: List[Union[float, None]] = list()
+    for window in windows:
+        value: Union[Dict[str, Any], None] = get_measure(measure, variable, date, window, station_code, host, username,
+                                                         token)
+        values.append(None if value is None else float(value['value']))
+    return values
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Version of the preprocessing, changing it invalidates the cached datasets
+CACHE_VERSION = 2
+
+SOLAR_IRRADIANCE_COLUMNS = ['SOLAR_IRRADIANCE', 'SUM_SOLAR_IRRADIANCE_1_DAY', 'SUM_SOLAR_IRRADIANCE_3_DAY',
+                            'SUM_SOLAR_IRRADIANCE_5_DAY', 'SUM_SOLAR_IRRADIANCE_10_DAY', 'SUM_SOLAR_IRRADIANCE_15_DAY']
+WIND_COLUMNS = ['WIND', 'SUM_WIND_1_DAY', 'SUM_WIND_3_DAY', 'SUM_WIND_5_DAY', 'SUM_WIND_10_DAY', 'SUM_WIND_15_DAY']
+
+# Columns dropped from the merged examples by each study, rows with NaN in the remaining ones are dropped and the land
+# covers are remapped to consecutive codes when remap_land_cover is set
+FEATURE_SETS = {
+    # Drop non useful columns
+    'logistic_regression': {
+        'drop': ['NUMBER_OF_SENSORS', 'HIT_GROUND',
+                 # 'AVG_REL_HUMIDITY_1_DAY', 'AVG_REL_HUMIDITY_3_DAY',
+                 'AVG_REL_HUMIDITY_5_DAY', 'AVG_REL_HUMIDITY_10_DAY', 'AVG_REL_HUMIDITY_15_DAY',
+                 # 'AVG_TEMPERATURE_1_DAY', 'AVG_TEMPERATURE_3_DAY',
+                 'AVG_TEMPERATURE_5_DAY', 'AVG_TEMPERATURE_10_DAY', 'AVG_TEMPERATURE_15_DAY',
+                 # 'SUM_RAIN_1_DAY', 'SUM_RAIN_3_DAY',
+                 'SUM_RAIN_5_DAY', 'SUM_RAIN_10_DAY', 'SUM_RAIN_15_DAY'] + SOLAR_IRRADIANCE_COLUMNS + WIND_COLUMNS,
+        'remap_land_cover': True,
+    },
+    # Drop non useful columns see correlation analysis, many weather station do not have solar irradiance nor wind.
+    # Used by the random forest and by both imbalanced studies
+    'correlation_analysis': {
+        'drop': ['NUMBER_OF_SENSORS', 'HIT_GROUND',
+                 # 'AVG_REL_HUMIDITY_1_DAY', 'AVG_REL_HUMIDITY_3_DAY',
+                 'AVG_REL_HUMIDITY_5_DAY', 'AVG_REL_HUMIDITY_10_DAY', 'AVG_REL_HUMIDITY_15_DAY',
+                 # 'AVG_TEMPERATURE_1_DAY',
+                 'AVG_TEMPERATURE_3_DAY', 'AVG_TEMPERATURE_5_DAY', 'AVG_TEMPERATURE_10_DAY', 'AVG_TEMPERATURE_15_DAY',
+                 # 'SUM_RAIN_1_DAY', 'SUM_RAIN_3_DAY',
+                 'SUM_RAIN_5_DAY', 'SUM_RAIN_10_DAY', 'SUM_RAIN_15_DAY'] + SOLAR_IRRADIANCE_COLUMNS + WIND_COLUMNS,
+        'remap_land_cover': True,
+    },
+    # Weather and lightning columns only, positives and negatives together
+    'multicollinearity': {
+        'drop': ['ID', 'NUMBER_OF_SENSORS', 'HIT_GROUND', 'DATE'] + SOLAR_IRRADIANCE_COLUMNS + WIND_COLUMNS + ['FIRE'],
+        'remap_land_cover': False,
+    },
+}
+
+
+def load_examples(filename, **csv_options):
+    # Arrow IPC files (.feather, .arrow) are memory mapped and keep the types they were written with, Parquet files are
+    # read with their schema and any other file is parsed as CSV with the given pandas options
+    if filename.endswith('.feather') or filename.endswith('.arrow'):
+        import pyarrow as pa
+        import pyarrow.ipc
+        table = pa.ipc.open_file(pa.memory_map(filename)).read_all()
+        # Columns without nulls are used without copying them from the mapped file
+        return table.to_pandas(split_blocks=True)
+    if filename.endswith('.parquet'):
+        return pd.read_parquet(filename, memory_map=True)
+    return pd.read_csv(filename, **csv_options)
+
+
+def add_arguments(parser):
+    parser.add_argument('--cache-folder', help='Folder where the loaded and preprocessed examples are kept to be '
+                                               'reused by the next runs with the same files', default=None)
+
+
+def cache_key(filenames, *definitions):
+    # Hash of the contents of the files and of the options they are read and preprocessed with
+    digest = hashlib.sha256(str(CACHE_VERSION).encode('utf-8'))
+    for filename in filenames:
+        with open(filename, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(b'\0')
+    for definition in definitions:
+        digest.update(json.dumps(definition, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def cached(cache_folder, name, key, build):
+    # Result of build() pickled in the cache folder, only built when it is not there
+    if cache_folder is None:
+        return build()
+    filename = os.path.join(cache_folder, '{}-{}.pkl'.format(name, key))
+    if os.path.exists(filename):
+        return pd.read_pickle(filename)
+    result = build()
+    os.makedirs(cache_folder, exist_ok=True)
+    pd.to_pickle(result, filename + '.tmp')
+    os.replace(filename + '.tmp', filename)
+    return result
+
+
+def read_example_files(positive_file, negative_file, negative_other_file, cache_folder=None, **csv_options):
+    # Positive, same day negative and other day negative examples, each one with its FIRE label as last column
+    filenames = [positive_file, negative_file, negative_other_file]
+
+    def build():
+        examples = list()
+        for filename, fire in zip(filenames, [1, 0, 0]):
+            file_examples = load_examples(filename, **csv_options)
+            file_examples['FIRE'] = fire
+            examples.append(file_examples)
+        return examples
+
+    return cached(cache_folder, 'examples', cache_key(filenames, csv_options), build)
+
+
+def merge_examples(examples):
+    return pd.concat(examples, ignore_index=True)
+
+
+def prepare_examples(positive_file, negative_file, negative_other_file, feature_set, cache_folder=None, **csv_options):
+    # Merged examples with the columns of the feature set and without NaN, as used to fit and test the models
+    filenames = [positive_file, negative_file, negative_other_file]
+
+    def build():
+        examples = merge_examples(read_example_files(positive_file, negative_file, negative_other_file, cache_folder,
+                                                     **csv_options))
+        examples.drop(columns=feature_set['drop'], inplace=True)
+        # Drop rows with NaN
+        examples.dropna(inplace=True)
+        if feature_set['remap_land_cover']:
+            # Remap LandCover
+            land_cover_values = list(examples['LAND_COVER'].unique())
+            land_cover_values.sort()
+            land_cover_dict = {land_cover_values[i]: i for i in range(len(land_cover_values))}
+            examples.replace({'LAND_COVER': land_cover_dict}, inplace=True)
+            # Kept to remap the land covers of the lightnings scored with the fitted models
+            examples.attrs['land_cover_mapping'] = {int(value): code for value, code in land_cover_dict.items()}
+        return examples
+
+    return cached(cache_folder, 'prepared', cache_key(filenames, csv_options, feature_set), build)
@@ -1,4 +1,3 @@
-import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import confusion_matrix
@@ -6,7 +5,33 @@ from sklearn.metrics import precision_recall_fscore_support
 from sklearn.model_selection import KFold
 import numpy as np
 import argparse
+from example_dataset import FEATURE_SETS
+from example_dataset import add_arguments
+from example_dataset import merge_examples
+from example_dataset import read_example_files
 import csv
+from joblib import Parallel
+from joblib import delayed
+
+
+def select_features(feature_matrix, land_cover_column, rows, land_cover_codes):
+    # Rows of the feature matrix with the land covers remapped for the ratio they belong to
+    x_values = feature_matrix[rows]
+    x_values[:, land_cover_column] = land_cover_codes
+    return x_values
+
+
+def evaluate_fold(feature_matrix, labels, land_cover_column, rows, land_cover_codes, train_index, cv_index):
+    x_train_data = select_features(feature_matrix, land_cover_column, rows[train_index], land_cover_codes[train_index])
+    x_cv_data = select_features(feature_matrix, land_cover_column, rows[cv_index], land_cover_codes[cv_index])
+    y_train_data, y_cv_data = labels[rows[train_index]], labels[rows[cv_index]]
+    random_forest = RandomForestClassifier(random_state=np.random.RandomState(1234567890), verbose=1)
+    random_forest.fit(x_train_data, y_train_data)
+    result = random_forest.predict(x_cv_data)
+    tn, fp, fn, tp = confusion_matrix(y_cv_data, result).ravel()
+    precision, recall, f_score, support = precision_recall_fscore_support(y_cv_data, result, average='binary')
+    return [tn, fp, fn, tp], [precision, recall, f_score]
+
 
 if __name__ == "__main__":  # pragma: no cover
     # Config the program arguments
@@ -16,113 +41,80 @@ if __name__ == "__main__":  # pragma: no cover
     parser.add_argument('-n', '--negative-file', help='Negative examples of the same day lightnings')
     parser.add_argument('-o', '--negative-other-file', help='Negative examples of other day lightnings')
     parser.add_argument('-r', '--results-file', help='Results filename')
+    parser.add_argument('-j', '--jobs', help='Number of folds fitted in parallel', default=1, type=int)
+    add_arguments(parser)
     args = parser.parse_args()
 
-    # Load all data
-    positive_examples = pd.read_csv(args.positive_file)
-    positive_examples['FIRE'] = 1
-    negative_examples = pd.read_csv(args.negative_file)
-    negative_examples['FIRE'] = 0
-    negative_other_examples = pd.read_csv(args.negative_other_file)
-    negative_other_examples['FIRE'] = 0
+    # Load all data and merge the dataframes once, each ratio is a selection of their rows
+    positive_examples, negative_examples, negative_other_examples = read_example_files(
+        args.positive_file, args.negative_file, args.negative_other_file, args.cache_folder)
+    examples = merge_examples([positive_examples, negative_examples, negative_other_examples])
+    examples.drop(columns=FEATURE_SETS['correlation_analysis']['drop'], inplace=True)
+    # Rows with NaN are never used
+    valid = examples.notna().all(axis=1).values
+    features = examples.drop(columns=['ID', 'DATE', 'FIRE'])
+    # The forest fits on float32, so the matrix is stored as it is used
+    feature_matrix = features.values.astype(np.float32)
+    labels = examples['FIRE'].values
+    land_covers = examples['LAND_COVER'].values
+    land_cover_column = features.columns.get_loc('LAND_COVER')
+    negative_start = len(positive_examples)
+    other_start = negative_start + len(negative_examples)
 
-    confusion = list()
     scores = list()
     scores_header = ['TEST_POINT', 'TN', 'FP', 'FN', 'TP', 'FN_RATIO', 'PRECISION', 'RECALL', 'F_SCORE']
     scores.append(scores_header)
     K_FOLDS = 5
+    # Folds of all the ratios are fitted at once, the matrix is memory mapped by joblib in the workers
+    folds = list()
+    test_scores = list()
     for i in range(1, 11):
-        # Merge all the dataframes
-        examples = positive_examples.copy()
-        examples = examples.append(negative_examples.iloc[::i].copy())
-        examples = examples.append(negative_other_examples.iloc[::i].copy())
-        examples.reset_index(drop=True, inplace=True)
-
-        # Drop non useful columns see correlation analysis
-        examples.drop('NUMBER_OF_SENSORS', axis=1, inplace=True)
-        examples.drop('HIT_GROUND', axis=1, inplace=True)
-        # examples.drop('AVG_REL_HUMIDITY_1_DAY', axis=1, inplace=True)
-        # examples.drop('AVG_REL_HUMIDITY_3_DAY', axis=1, inplace=True)
-        examples.drop('AVG_REL_HUMIDITY_5_DAY', axis=1, inplace=True)
-        examples.drop('AVG_REL_HUMIDITY_10_DAY', axis=1, inplace=True)
-        examples.drop('AVG_REL_HUMIDITY_15_DAY', axis=1, inplace=True)
-        # examples.drop('AVG_TEMPERATURE_1_DAY', axis=1, inplace=True)
-        examples.drop('AVG_TEMPERATURE_3_DAY', axis=1, inplace=True)
-        examples.drop('AVG_TEMPERATURE_5_DAY', axis=1, inplace=True)
-        examples.drop('AVG_TEMPERATURE_10_DAY', axis=1, inplace=True)
-        examples.drop('AVG_TEMPERATURE_15_DAY', axis=1, inplace=True)
-        # examples.drop('SUM_RAIN_1_DAY', axis=1, inplace=True)
-        # examples.drop('SUM_RAIN_3_DAY', axis=1, inplace=True)
-        examples.drop('SUM_RAIN_5_DAY', axis=1, inplace=True)
-        examples.drop('SUM_RAIN_10_DAY', axis=1, inplace=True)
-        examples.drop('SUM_RAIN_15_DAY', axis=1, inplace=True)
-        # Many weather station do not have this data
-        examples.drop('SOLAR_IRRADIANCE', axis=1, inplace=True)
-        examples.drop('SUM_SOLAR_IRRADIANCE_1_DAY', axis=1, inplace=True)
-        examples.drop('SUM_SOLAR_IRRADIANCE_3_DAY', axis=1, inplace=True)
-        examples.drop('SUM_SOLAR_IRRADIANCE_5_DAY', axis=1, inplace=True)
-        examples.drop('SUM_SOLAR_IRRADIANCE_10_DAY', axis=1, inplace=True)
-        examples.drop('SUM_SOLAR_IRRADIANCE_15_DAY', axis=1, inplace=True)
-        examples.drop('WIND', axis=1, inplace=True)
-        examples.drop('SUM_WIND_1_DAY', axis=1, inplace=True)
-        examples.drop('SUM_WIND_3_DAY', axis=1, inplace=True)
-        examples.drop('SUM_WIND_5_DAY', axis=1, inplace=True)
-        examples.drop('SUM_WIND_10_DAY', axis=1, inplace=True)
-        examples.drop('SUM_WIND_15_DAY', axis=1, inplace=True)
-        rows_before = len(examples.index)
-        # Drop rows with NaN
-        examples.dropna(inplace=True)
-        rows_after = len(examples.index)
-        # print(rows_after, rows_before)
-
-        # Remap LandCover
-        land_cover_values = list(examples['LAND_COVER'].unique())
-        land_cover_values.sort()
-        land_cover_dict = {land_cover_values[i]: i for i in range(len(land_cover_values))}
-        examples.replace({'LAND_COVER': land_cover_dict}, inplace=True)
+        # All the positives and every i-th negative of each file, as iloc[::i] does
+        rows = np.concatenate([np.arange(negative_start), np.arange(negative_start, other_start, i),
+                               np.arange(other_start, len(examples), i)])
+        rows = rows[valid[rows]]
+
+        # Remap LandCover to the position of each value among the sorted values of the ratio
+        _, land_cover_codes = np.unique(land_covers[rows], return_inverse=True)
 
         # Create Learning and test  datasets
-        learn, test = train_test_split(examples, train_size=0.8, shuffle=True,
+        learn, test = train_test_split(np.arange(len(rows)), train_size=0.8, shuffle=True,
                                        random_state=np.random.RandomState(1234567890))
-        learn_data = learn.copy()
-        learn_data.drop('ID', axis=1, inplace=True)
-        learn_data.drop('DATE', axis=1, inplace=True)
-        test_data = test.copy()
-        test_data.drop('ID', axis=1, inplace=True)
-        test_data.drop('DATE', axis=1, inplace=True)
-
-        intermediate_confusion = list()
-        intermediate_scores = list()
-        X = learn_data.iloc[:, :-1]
-        Y = learn_data.iloc[:, -1]
+        learn_rows, learn_codes = rows[learn], land_cover_codes[learn]
+        test_rows, test_codes = rows[test], land_cover_codes[test]
+
         kf = KFold(n_splits=K_FOLDS)
-        kf.get_n_splits(X)
-        for train_index, cv_index in kf.split(X):
+        kf.get_n_splits(learn_rows)
+        for train_index, cv_index in kf.split(learn_rows):
             # print("TRAIN:", train_index, "TEST:", cv_index)
-            x_train_data, x_cv_data = X.values[train_index], X.values[cv_index]
-            y_train_data, y_cv_data = Y.values[train_index], Y.values[cv_index]
+            folds.append((i, learn_rows, learn_codes, train_index, cv_index))
+
+        if i == 10:
+            x_learn_data = select_features(feature_matrix, land_cover_column, learn_rows, learn_codes)
+            y_learn_data = labels[learn_rows]
+            x_test_data = select_features(feature_matrix, land_cover_column, test_rows, test_codes)
+            y_test_data = labels[test_rows]
             random_forest = RandomForestClassifier(random_state=np.random.RandomState(1234567890), verbose=1)
-            random_forest.fit(x_train_data, y_train_data)
-            result = random_forest.predict(x_cv_data)
-            tn, fp, fn, tp = confusion_matrix(y_cv_data, result).ravel()
-            intermediate_confusion.append([tn, fp, fn, tp])
-            precision, recall, f_score, support = precision_recall_fscore_support(y_cv_data, result, average='binary')
-            intermediate_scores.append([precision, recall, f_score])
+            random_forest.fit(x_learn_data, y_learn_data)
+            result = random_forest.predict(x_test_data)
+
+            tn, fp, fn, tp = confusion_matrix(y_test_data, result).ravel()
+            precision, recall, f_score, support = precision_recall_fscore_support(y_test_data, result,
+                                                                                  average='binary')
+            test_scores.append([-1, tn, fp, fn, tp, fn / (tn + fp + fn + tp), precision, recall, f_score])
+
+    fold_results = Parallel(n_jobs=args.jobs)(
+        delayed(evaluate_fold)(feature_matrix, labels, land_cover_column, *fold[1:]) for fold in folds)
+    for i in range(1, 11):
+        intermediate_confusion = [fold_confusion for fold, (fold_confusion, _) in zip(folds, fold_results)
+                                  if fold[0] == i]
+        intermediate_scores = [score for fold, (_, score) in zip(folds, fold_results) if fold[0] == i]
         column_average = [i]
         column_average += [sum(sub_list) / len(sub_list) for sub_list in zip(*intermediate_confusion)]
         column_average += [column_average[2] / sum(column_average)] # FN / all
         column_average += [sum(sub_list) / len(sub_list) for sub_list in zip(*intermediate_scores)]
         scores.append(column_average)
-
-        if i == 10:
-            random_forest = RandomForestClassifier(random_state=np.random.RandomState(1234567890), verbose=1)
-            random_forest.fit(learn_data.iloc[:, :-1], learn_data.iloc[:, -1])
-            result = random_forest.predict(test_data.iloc[:, :-1])
-
-            tn, fp, fn, tp = confusion_matrix(test_data.iloc[:, -1], result).ravel()
-            precision, recall, f_score, support = precision_recall_fscore_support(test_data.iloc[:, -1], result,
-                                                                                  average='binary')
-            scores.append([-1, tn, fp, fn, tp, fn / (tn + fp + fn + tp), precision, recall, f_score])
+    scores += test_scores
 
     with open(args.results_file, 'w') as file:
         writer = csv.writer(file)
@@ -0,0 +1,10 @@
+import joblib
+
+
+def save_model(filename, estimator, features, land_cover_mapping):
+    # The fitted estimator with the columns it was fitted with, in order, and the codes given to the land covers
+    joblib.dump({'estimator': estimator, 'features': features, 'land_cover_mapping': land_cover_mapping}, filename)
+
+
+def load_model(filename):
+    return joblib.load(filename)
@@ -1,7 +1,9 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import argparse
+from example_dataset import FEATURE_SETS
+from example_dataset import add_arguments
+from example_dataset import prepare_examples
 
 if __name__ == "__main__":  # pragma: no cover
     # Config the program arguments
@@ -10,38 +12,12 @@ if __name__ == "__main__":  # pragma: no cover
     parser.add_argument('-p', '--positive-file', help='Positive examples lightnings file')
     parser.add_argument('-n', '--negative-file', help='Negative examples of the same day lightnings')
     parser.add_argument('-o', '--negative-other-file', help='Negative examples of other day lightnings')
+    add_arguments(parser)
     args = parser.parse_args()
 
-    # Load all data
-    positive_examples = pd.read_csv(args.positive_file)
-    negative_examples = pd.read_csv(args.negative_file)
-    negative_other_examples = pd.read_csv(args.negative_other_file)
-
-    # Merge all the dataframes
-    examples = positive_examples.copy()
-    examples = examples.append(negative_examples.copy())
-    examples = examples.append(negative_other_examples.copy())
-    examples.reset_index(drop=True, inplace=True)
-
-    # Drop non useful columns
-    examples.drop('ID', axis=1, inplace=True)
-    examples.drop('NUMBER_OF_SENSORS', axis=1, inplace=True)
-    examples.drop('HIT_GROUND', axis=1, inplace=True)
-    examples.drop('DATE', axis=1, inplace=True)
-    examples.drop('SOLAR_IRRADIANCE', axis=1, inplace=True)
-    examples.drop('SUM_SOLAR_IRRADIANCE_1_DAY', axis=1, inplace=True)
-    examples.drop('SUM_SOLAR_IRRADIANCE_3_DAY', axis=1, inplace=True)
-    examples.drop('SUM_SOLAR_IRRADIANCE_5_DAY', axis=1, inplace=True)
-    examples.drop('SUM_SOLAR_IRRADIANCE_10_DAY', axis=1, inplace=True)
-    examples.drop('SUM_SOLAR_IRRADIANCE_15_DAY', axis=1, inplace=True)
-    examples.drop('WIND', axis=1, inplace=True)
-    examples.drop('SUM_WIND_1_DAY', axis=1, inplace=True)
-    examples.drop('SUM_WIND_3_DAY', axis=1, inplace=True)
-    examples.drop('SUM_WIND_5_DAY', axis=1, inplace=True)
-    examples.drop('SUM_WIND_10_DAY', axis=1, inplace=True)
-    examples.drop('SUM_WIND_15_DAY', axis=1, inplace=True)
-    # Drop rows with NaN
-    examples.dropna(inplace=True)
+    # Load all data, merged and without the non useful columns and rows with NaN
+    examples = prepare_examples(args.positive_file, args.negative_file, args.negative_other_file,
+                                FEATURE_SETS['multicollinearity'], args.cache_folder)
     print(examples.astype(float))
     multi_correlations = examples.corr()
     print(multi_correlations)
@@ -0,0 +1,68 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_file import load_model
+
+
+def read_chunks(filename, columns, chunk_size):
+    # DataFrames of at most chunk_size rows with the given columns of a lightnings file, Parquet and Arrow IPC files are
+    # read by record batches and any other file is parsed as CSV
+    if filename.endswith('.parquet'):
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(filename).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif filename.endswith('.feather') or filename.endswith('.arrow'):
+        import pyarrow as pa
+        import pyarrow.ipc
+        reader = pa.ipc.open_file(pa.memory_map(filename))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).select(columns)
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pandas()
+    else:
+        for chunk in pd.read_csv(filename, usecols=columns, chunksize=chunk_size):
+            yield chunk[columns]
+
+
+def score_chunk(model, chunk):
+    # Probability of fire of each lightning, NaN when a feature is missing or the land cover was not seen in training
+    features = chunk[model['features']].copy()
+    features['LAND_COVER'] = features['LAND_COVER'].map(model['land_cover_mapping'])
+    valid = features.notna().all(axis=1).values
+    probabilities = np.full(len(features), np.nan)
+    if np.any(valid):
+        estimator = model['estimator']
+        fire = list(estimator.classes_).index(1)
+        probabilities[valid] = estimator.predict_proba(features[valid].astype(float))[:, fire]
+    return probabilities
+
+
+if __name__ == "__main__":  # pragma: no cover
+    # Config the program arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--model-file', help='Model saved by a learn script with --save-model')
+    parser.add_argument('-i', '--input-file', help='Enriched lightnings file, as written by the fill scripts')
+    parser.add_argument('-o', '--output-file', help='File with the fire probability of each lightning ID')
+    parser.add_argument('-c', '--chunk-size', help='Number of lightnings scored at once', default=100000, type=int)
+    args = parser.parse_args()
+
+    model = load_model(args.model_file)
+    # The fitting progress messages are not wanted while scoring
+    if hasattr(model['estimator'], 'verbose'):
+        model['estimator'].verbose = 0
+    start = time.perf_counter()
+    rows = 0
+    with open(args.output_file, 'w') as file:
+        writer = csv.writer(file)
+        writer.writerow(['ID', 'PROBABILITY'])
+        for chunk in read_chunks(args.input_file, ['ID'] + model['features'], args.chunk_size):
+            probabilities = score_chunk(model, chunk)
+            writer.writerows(zip(chunk['ID'].values.tolist(),
+                                 ['' if np.isnan(value) else value for value in probabilities.tolist()]))
+            rows += len(chunk)
+    elapsed = time.perf_counter() - start
+    print('{} rows scored in {:.1f} s, {:.0f} rows/s'.format(rows, elapsed, rows / max(elapsed, 1e-9)))